@@ -8,10 +8,20 @@ Provides analytics data for teachers including:
 - Level mismatch and advancement detection
 """
 
+import hashlib
+import heapq
+import io
+import itertools
 import os
-from datetime import datetime, timedelta, timezone
-from typing import Dict, List, Optional, Any
-from collections import defaultdict
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from sys import intern
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional, Any
+from collections import Counter, defaultdict
 
 from google import genai
 from google.cloud import firestore
@@ -20,16 +30,95 @@ from google.oauth2 import service_account
 from app.config import config
 
 
+# Shared pool for overlapping per-user Firestore round trips.
+# gRPC releases the GIL while waiting on the network; gains plateau around 40 workers.
+PER_USER_QUERY_WORKERS = 40
+_per_user_executor = ThreadPoolExecutor(
+    max_workers=PER_USER_QUERY_WORKERS,
+    thread_name_prefix='analytics-query'
+)
+
+# Separate pool for overlapping independent top-level queries. These tasks fan
+# out onto _per_user_executor themselves, so they must not share it.
+_top_level_executor = ThreadPoolExecutor(
+    max_workers=8,
+    thread_name_prefix='analytics-top'
+)
+
+
+def _iso(ts) -> Optional[str]:
+    """ISO string for a Firestore timestamp (DatetimeWithNanoseconds), or None."""
+    return ts.isoformat() if ts is not None else None
+
+
+@dataclass(slots=True)
+class LevelBucket:
+    """Per-CEFR-level accumulator filled by AnalyticsService._aggregate_by_level."""
+    sessions: List[Dict] = field(default_factory=list)
+    user_ids: set = field(default_factory=set)
+    struggles: List[Dict] = field(default_factory=list)
+    star_sum: int = 0
+    star_count: int = 0
+    duration_seconds: int = 0
+    prev_star_sum: int = 0
+    prev_star_count: int = 0
+
+
 class AnalyticsService:
     """Service for generating teacher analytics."""
 
     ACTIVE_THRESHOLD = 3
     WARNING_THRESHOLD = 7
+    _ACTIVITY_STATUS_LABELS = ("active", "warning", "inactive")
     ADVANCEMENT_MIN_SESSIONS = 5
     ADVANCEMENT_MIN_AVG_STARS = 4.5
     MISMATCH_STRUGGLE_THRESHOLD = 3
     CEFR_LEVELS = ['A1', 'A2', 'B1', 'B2', 'C1', 'C2']
 
+    # Max document refs per batched get_all call
+    GET_ALL_BATCH_SIZE = 300
+
+    # Snapshot docs per WriteBatch commit (Firestore caps a batch at 500 writes)
+    SNAPSHOT_WRITE_BATCH_SIZE = 400
+
+    # Sessions fetched per cursor page in _query_sessions
+    SESSION_PAGE_SIZE = 1000
+
+    # Session fields read by aggregation; everything else stays on the server
+    SESSION_FIELDS = ['missionId', 'userId', 'stars', 'targetLevel']
+
+    # Firestore clients shared round-robin across request and pool threads
+    FIRESTORE_CLIENT_POOL_SIZE = 4
+
+    # In-process cache for get_teacher_analytics (dashboard + pulse hit it back-to-back)
+    ANALYTICS_CACHE_TTL_SECONDS = 60
+    ANALYTICS_CACHE_MAX_ENTRIES = 512
+
+    # In-process cache of users/{uid} docs (level/displayName change slowly)
+    USER_CACHE_TTL_SECONDS = 120
+    USER_CACHE_MAX_ENTRIES = 10000
+
+    # Activity status wording used in the Class Pulse prompt
+    _PROMPT_STATUS_LABELS = {
+        'active': 'practicing regularly',
+        'warning': 'hasn\'t practiced in a few days',
+        'inactive': 'inactive 7+ days'
+    }
+    # avg stars < 3 -> struggling, < 4 -> solid, else excellent
+    _PROMPT_PERF_THRESHOLDS = (3, 4)
+    _PROMPT_PERF_TIERS = ('struggling', 'solid', 'excellent')
+
+    # In-process cache for get_class_pulse (today's dailyInsights doc is read on every page load).
+    # Regenerating invalidates only this process's entry; other instances may
+    # serve the previous pulse until their entry expires (at most the TTL).
+    PULSE_CACHE_TTL_SECONDS = 300
+    PULSE_CACHE_MAX_ENTRIES = 1000
+
+    # Class Pulse prompt budget: past this many characters of class data,
+    # list fewer students per level (input tokens drive Gemini latency/cost)
+    PULSE_CLASS_DATA_MAX_CHARS = 4000
+    PULSE_COMPACT_STUDENTS_PER_LEVEL = 3
+
     # Smart triggering thresholds
     MIN_NEW_SESSIONS_FOR_REGEN = 3
     MIN_NEW_STRUGGLES_FOR_REGEN = 5
@@ -84,20 +173,42 @@ Respond with ONLY valid JSON:
     }}
   ]
 }}"""
+    # Template resolved once (escaped braces included) and split around the
+    # data slot, so each call is a plain concatenation instead of str.format
+    _PULSE_PROMPT_HEAD, _PULSE_PROMPT_TAIL = CLASS_PULSE_PROMPT.format(class_data='\x00').split('\x00')
 
     def __init__(self):
         """Initialize with Firestore and Gemini clients."""
+        # (teacher_id, period, level) -> (cached_at_monotonic, analytics)
+        self._analytics_cache: Dict[tuple, tuple] = {}
+        self._analytics_cache_lock = threading.Lock()
+        # uid -> (cached_at_monotonic, user doc dict)
+        self._user_cache: Dict[str, tuple] = {}
+        self._user_cache_lock = threading.Lock()
+        # teacher_id -> (cached_at_monotonic, day, pulse response)
+        self._pulse_cache: Dict[str, tuple] = {}
+        self._pulse_cache_lock = threading.Lock()
+
         creds_path = os.path.join(
             os.path.dirname(os.path.dirname(__file__)),
             'firebase-service-account.json'
         )
         if os.path.exists(creds_path):
             credentials = service_account.Credentials.from_service_account_file(creds_path)
-            self._db = firestore.Client(project='ndtutorlive', credentials=credentials)
-            print(f"[Analytics] Firestore initialized with service account", flush=True)
+            source = "service account"
         else:
-            self._db = firestore.Client(project='ndtutorlive')
-            print(f"[Analytics] Firestore initialized with default credentials", flush=True)
+            credentials = None
+            source = "default credentials"
+
+        # Several clients (one gRPC channel each) so the fan-out pools don't
+        # queue behind one connection; each thread sticks to one client
+        self._db_clients = [
+            firestore.Client(project='ndtutorlive', credentials=credentials)
+            for _ in range(self.FIRESTORE_CLIENT_POOL_SIZE)
+        ]
+        self._db_thread_local = threading.local()
+        self._db_round_robin = itertools.count()
+        print(f"[Analytics] Firestore initialized with {source} ({len(self._db_clients)} clients)", flush=True)
 
         # Initialize Gemini client for Class Pulse insights
         if config.GEMINI_API_KEY:
@@ -107,43 +218,105 @@ Respond with ONLY valid JSON:
             self._gemini = None
             print(f"[Analytics] WARNING: No GEMINI_API_KEY - Class Pulse will use fallback insights", flush=True)
 
+    @property
+    def _db(self) -> firestore.Client:
+        """Firestore client for the calling thread, assigned round-robin on first use."""
+        client = getattr(self._db_thread_local, 'client', None)
+        if client is None:
+            client = self._db_clients[next(self._db_round_robin) % len(self._db_clients)]
+            self._db_thread_local.client = client
+        return client
+
     def get_teacher_analytics(
         self,
         teacher_id: str,
         period: str = "week",
         level: str = "all"
     ) -> Dict[str, Any]:
-        """Main entry point for teacher analytics."""
+        """Main entry point for teacher analytics. Results are cached briefly per (teacher, period, level)."""
+        cache_key = (teacher_id, period, level)
+        now = time.monotonic()
+        with self._analytics_cache_lock:
+            cached = self._analytics_cache.get(cache_key)
+        if cached and now - cached[0] < self.ANALYTICS_CACHE_TTL_SECONDS:
+            print(f"[Analytics] Cache hit for teacher {teacher_id}, period={period}, level={level}", flush=True)
+            return cached[1]
+
+        result = self._compute_teacher_analytics(teacher_id, period, level)
+
+        with self._analytics_cache_lock:
+            self._analytics_cache[cache_key] = (time.monotonic(), result)
+            if len(self._analytics_cache) > self.ANALYTICS_CACHE_MAX_ENTRIES:
+                self._evict_analytics_cache()
+        return result
+
+    def _evict_analytics_cache(self) -> None:
+        """Drop expired entries, then the oldest ones, until under the size limit. Caller holds the lock."""
+        now = time.monotonic()
+        for key in [k for k, (ts, _) in self._analytics_cache.items() if now - ts >= self.ANALYTICS_CACHE_TTL_SECONDS]:
+            del self._analytics_cache[key]
+        while len(self._analytics_cache) > self.ANALYTICS_CACHE_MAX_ENTRIES:
+            del self._analytics_cache[next(iter(self._analytics_cache))]
+
+    def _compute_teacher_analytics(
+        self,
+        teacher_id: str,
+        period: str,
+        level: str
+    ) -> Dict[str, Any]:
+        """Run all Firestore queries and aggregation for get_teacher_analytics."""
         print(f"[Analytics] Getting analytics for teacher {teacher_id}, period={period}, level={level}", flush=True)
 
         start_time, end_time = self._get_time_range(period)
         prev_start, prev_end = self._get_previous_period(period, start_time)
 
+        submit = _top_level_executor.submit
+
+        # Previous period only feeds trend scalars: read the nightly snapshots
+        # when they cover it, otherwise aggregate it server-side. Snapshots are
+        # keyed by level, so a level filter just reads that level's entry.
+        # The snapshot read only needs the dates, so it overlaps the missions query.
+        snapshot_future = submit(self._load_snapshot_trend_inputs, teacher_id, prev_start, prev_end) if prev_start else None
+
         missions = self._query_missions(teacher_id, level)
         mission_map = {m.id: m.to_dict() for m in missions}
-        mission_ids = list(mission_map.keys())
 
-        if not mission_ids:
+        if not mission_map:
             return self._empty_response(period)
 
-        sessions = self._query_sessions(mission_ids, start_time, end_time)
-        prev_sessions = self._query_sessions(mission_ids, prev_start, prev_end) if prev_start else []
+        prev_snapshot = snapshot_future.result() if snapshot_future else None
+        live_prev = prev_start is not None and prev_snapshot is None
 
+        prev_counts_future = submit(self._count_sessions_by_level, mission_map, prev_start, prev_end) if live_prev else None
+        prev_stars_future = submit(self._class_star_totals, teacher_id, prev_start, prev_end) if live_prev else None
+        sessions = self._query_sessions(mission_map, start_time, end_time)
+
+        # Everything below depends only on user_ids, so overlap the round trips
         user_ids = list(set(s.get('userId') for s in sessions if s.get('userId')))
+        summaries_future = submit(self._query_session_summaries, teacher_id, user_ids, start_time, end_time)
+        struggles_future = submit(self._query_struggles, user_ids, start_time, end_time)
         users = self._query_users(user_ids)
-        session_summaries = self._query_session_summaries(user_ids, start_time, end_time)
-        prev_summaries = self._query_session_summaries(user_ids, prev_start, prev_end) if prev_start else {}
-        struggles = self._query_struggles(user_ids, start_time, end_time)
+        costs_future = submit(self._aggregate_costs, teacher_id, user_ids, start_time, end_time, users, period)
+
+        if prev_snapshot:
+            prev_session_counts, prev_star_totals = prev_snapshot
+        elif live_prev:
+            prev_session_counts = prev_counts_future.result()
+            prev_star_totals = prev_stars_future.result()
+        else:
+            prev_session_counts, prev_star_totals = {}, {}
+        session_summaries = summaries_future.result()
+        struggles = struggles_future.result()
 
         by_level = self._aggregate_by_level(
-            mission_map, sessions, prev_sessions,
-            users, session_summaries, prev_summaries, struggles
+            mission_map, sessions, prev_session_counts,
+            users, session_summaries, prev_star_totals, struggles
         )
         totals = self._calculate_totals(by_level)
         cross_level = self._detect_cross_level_insights(sessions, users, struggles, mission_map)
 
         # Get cost data from token usage
-        costs, student_costs = self._aggregate_costs(user_ids, start_time, end_time, users, period)
+        costs, student_costs = costs_future.result()
 
         return {
             "period": period,
@@ -166,10 +339,21 @@ Respond with ONLY valid JSON:
         return start, now
 
     def _get_previous_period(self, period: str, current_start: datetime) -> tuple:
+        """
+        Previous period as whole UTC days: the 7 or 30 days before the day the
+        current window starts, so it lines up exactly with the daily snapshots.
+        Both bounds are inclusive, like build_daily_snapshot's.
+        """
         if period == "all-time":
             return None, None
-        delta = timedelta(days=7) if period == "week" else timedelta(days=30)
-        return current_start - delta, current_start
+        days = 7 if period == "week" else 30
+        day_start = datetime(current_start.year, current_start.month, current_start.day, tzinfo=timezone.utc)
+        return day_start - timedelta(days=days), day_start - timedelta(microseconds=1)
+
+    def _teacher_tagged(self, start_time: datetime) -> bool:
+        """True when every doc created from start_time on carries teacherId (see TEACHER_ID_TAGGED_SINCE)."""
+        since = config.TEACHER_ID_TAGGED_SINCE
+        return since is not None and start_time.date() >= since
 
     def _query_missions(self, teacher_id: str, level: str) -> List:
         query = self._db.collection('missions').where('teacherId', '==', teacher_id)
@@ -177,24 +361,135 @@ Respond with ONLY valid JSON:
             query = query.where('targetLevel', '==', level)
         return list(query.stream())
 
-    def _query_sessions(self, mission_ids: List[str], start_time: datetime, end_time: datetime) -> List[Dict]:
-        if not mission_ids:
+    def _query_sessions(
+        self,
+        mission_map: Dict[str, Dict],
+        start_time: datetime,
+        end_time: datetime
+    ) -> List[Dict]:
+        """
+        Query sessions for a teacher's missions by missionId, in 30-mission
+        `in` batches (mission_map is already level-filtered), which keeps the
+        mission->session tenant chain.
+
+        Root sessions only get teacherId/targetLevel when their summary is
+        saved, and that write is best effort, so they are never selected by
+        the denormalized fields (see TEACHER_ID_TAGGED_SINCE).
+
+        Only SESSION_FIELDS are fetched, in SESSION_PAGE_SIZE pages resumed from
+        a start_after cursor, so a busy teacher's range is never one long stream.
+        """
+        if not mission_map:
             return []
+        sessions_col = self._db.collection('sessions')
+        mission_ids = list(mission_map)
+        queries = [
+            sessions_col.where('missionId', 'in', mission_ids[i:i+30])
+            for i in range(0, len(mission_ids), 30)
+        ]
+
         sessions = []
-        for i in range(0, len(mission_ids), 30):
-            batch_ids = mission_ids[i:i+30]
+        for query in queries:
             query = (
-                self._db.collection('sessions')
-                .where('missionId', 'in', batch_ids)
-                .where('createdAt', '>=', start_time)
+                query.where('createdAt', '>=', start_time)
                 .where('createdAt', '<=', end_time)
+                .order_by('createdAt')
+                .select(self.SESSION_FIELDS + ['createdAt'])
+                .limit(self.SESSION_PAGE_SIZE)
             )
-            for doc in query.stream():
-                data = doc.to_dict()
-                data['id'] = doc.id
-                sessions.append(data)
+            page = query
+            while True:
+                docs = list(page.stream())
+                for doc in docs:
+                    data = doc.to_dict()
+                    data['id'] = doc.id
+                    sessions.append(data)
+                if len(docs) < self.SESSION_PAGE_SIZE:
+                    break
+                page = query.start_after(docs[-1])
         return sessions
 
+    def _run_aggregation(self, aggregation_query) -> Dict[str, Any]:
+        """Execute a Firestore aggregation query and return {alias: value}."""
+        results = aggregation_query.get()
+        return {result.alias: result.value for result in results[0]} if results else {}
+
+    def _count_sessions_by_level(
+        self,
+        mission_map: Dict[str, Dict],
+        start_time: datetime,
+        end_time: datetime
+    ) -> Dict[str, int]:
+        """
+        Count sessions per mission target level with server-side count()
+        aggregations, selecting sessions the same way _query_sessions does.
+        """
+        mission_ids_by_level = defaultdict(list)
+        for mid, mission in mission_map.items():
+            mission_ids_by_level[mission.get('targetLevel', 'B1')].append(mid)
+
+        sessions_col = self._db.collection('sessions')
+        counts = {}
+        for level, level_mission_ids in mission_ids_by_level.items():
+            queries = [
+                sessions_col.where('missionId', 'in', level_mission_ids[i:i+30])
+                for i in range(0, len(level_mission_ids), 30)
+            ]
+            total = 0
+            for query in queries:
+                query = query.where('createdAt', '>=', start_time).where('createdAt', '<=', end_time)
+                total += int(self._run_aggregation(query.count(alias='count')).get('count') or 0)
+            counts[level] = total
+        return counts
+
+    def _sum_summary_stars(self, user_ids: List[str], start_time: datetime, end_time: datetime) -> Dict[str, tuple]:
+        """
+        Sum session summary stars per user with server-side aggregations.
+
+        Returns {user_id: (star_sum, rated_count)}. Only rated summaries
+        (stars > 0) are counted, matching the current-period average; the
+        (createdAt, stars) index serves the two range filters.
+        """
+        def aggregate(user_id: str) -> tuple:
+            query = (
+                self._db.collection('users').document(user_id)
+                .collection('sessionSummaries')
+                .where('createdAt', '>=', start_time)
+                .where('createdAt', '<=', end_time)
+                .where('stars', '>', 0)
+            )
+            totals = self._run_aggregation(query.sum('stars', alias='starSum').count(alias='count'))
+            return totals.get('starSum') or 0, int(totals.get('count') or 0)
+
+        return self._parallel_per_user(user_ids, aggregate)
+
+    def _star_totals_by_level(self, star_totals: Dict[str, tuple], users: Dict[str, Dict]) -> Dict[str, tuple]:
+        """Fold {user_id: (star_sum, count)} into {level: (star_sum, count)} by each user's level."""
+        by_level = {}
+        for user_id, (star_sum, star_count) in star_totals.items():
+            user_level = users.get(user_id, {}).get('level', 'B1')
+            level_sum, level_count = by_level.get(user_level, (0, 0))
+            by_level[user_level] = (level_sum + star_sum, level_count + star_count)
+        return by_level
+
+    def _class_star_totals(self, teacher_id: str, start_time: datetime, end_time: datetime) -> Dict[str, tuple]:
+        """
+        Summary stars of every student assigned to the teacher, as
+        {level: (star_sum, count)} by each student's level.
+
+        The previous-period trend and the daily snapshots both use this, so a
+        period summed from snapshots matches the live aggregate; they only
+        drift when a student changed class or level after the snapshot.
+        """
+        students_query = (
+            self._db.collection('users')
+            .where('teacherId', '==', teacher_id)
+            .select(['level'])
+        )
+        students = {doc.id: doc.to_dict() for doc in students_query.stream()}
+        star_totals = self._sum_summary_stars(list(students), start_time, end_time)
+        return self._star_totals_by_level(star_totals, students)
+
     def _query_users(self, user_ids: List[str]) -> Dict[str, Dict]:
         """
         Query user documents by their IDs.
@@ -206,34 +501,106 @@ Respond with ONLY valid JSON:
         Students have a `teacherId` field linking them to their assigned teacher,
         but the filtering here relies on the mission->session chain rather than
         direct teacherId filtering.
+
+        Docs read within USER_CACHE_TTL_SECONDS are served from memory; only
+        the misses are fetched.
         """
         users = {}
-        for user_id in user_ids:
-            doc = self._db.collection('users').document(user_id).get()
-            if doc.exists:
-                users[user_id] = doc.to_dict()
+        missing = []
+        now = time.monotonic()
+        with self._user_cache_lock:
+            for uid in user_ids:
+                cached = self._user_cache.get(uid)
+                if cached and now - cached[0] < self.USER_CACHE_TTL_SECONDS:
+                    users[uid] = cached[1]
+                else:
+                    missing.append(uid)
+        if not missing:
+            return users
+
+        fetched = {}
+        users_col = self._db.collection('users')
+        # Batch point reads with get_all - one round trip per chunk instead of per user
+        for i in range(0, len(missing), self.GET_ALL_BATCH_SIZE):
+            refs = [users_col.document(uid) for uid in missing[i:i+self.GET_ALL_BATCH_SIZE]]
+            for doc in self._db.get_all(refs):
+                if doc.exists:
+                    fetched[doc.id] = doc.to_dict()
+        users.update(fetched)
+
+        now = time.monotonic()
+        with self._user_cache_lock:
+            for uid, data in fetched.items():
+                self._user_cache.pop(uid, None)
+                self._user_cache[uid] = (now, data)
+            # Insertion order is fetch order, so the front holds the oldest entries
+            while len(self._user_cache) > self.USER_CACHE_MAX_ENTRIES:
+                del self._user_cache[next(iter(self._user_cache))]
         return users
 
-    def _query_session_summaries(self, user_ids: List[str], start_time: datetime, end_time: datetime) -> Dict[str, List[Dict]]:
-        summaries = defaultdict(list)
-        for user_id in user_ids:
+    def _parallel_per_user(self, user_ids: List[str], fn: Callable[[str], Any]) -> Dict[str, Any]:
+        """
+        Run fn(user_id) for every user on the shared query pool.
+
+        Returns {user_id: result}. Must not be called from inside a pool task.
+        """
+        futures = {_per_user_executor.submit(fn, uid): uid for uid in user_ids}
+        results = {}
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+        return results
+
+    def _query_session_summaries(
+        self,
+        teacher_id: str,
+        user_ids: List[str],
+        start_time: datetime,
+        end_time: datetime
+    ) -> Dict[str, List[Dict]]:
+        """
+        Session summaries per student. Windows covered by
+        TEACHER_ID_TAGGED_SINCE use one collection-group query on the
+        denormalized teacherId, with a per-user query for students it misses.
+        Older windows may hold summaries without teacherId, so every student
+        gets the per-user query.
+        """
+        wanted = set(user_ids)
+        results = defaultdict(list)
+        if self._teacher_tagged(start_time):
+            try:
+                query = (
+                    self._db.collection_group('sessionSummaries')
+                    .where('teacherId', '==', teacher_id)
+                    .where('createdAt', '>=', start_time)
+                    .where('createdAt', '<=', end_time)
+                )
+                for doc in query.stream():
+                    user_id = doc.reference.parent.parent.id
+                    if user_id in wanted:
+                        results[user_id].append(doc.to_dict())
+            except Exception as e:
+                print(f"[Analytics] Error querying class session summaries for teacher {teacher_id}: {e}", flush=True)
+                results.clear()
+
+        def fetch(user_id: str) -> List[Dict]:
             query = (
                 self._db.collection('users').document(user_id)
                 .collection('sessionSummaries')
                 .where('createdAt', '>=', start_time)
                 .where('createdAt', '<=', end_time)
             )
-            for doc in query.stream():
-                summaries[user_id].append(doc.to_dict())
-        return dict(summaries)
+            return [doc.to_dict() for doc in query.stream()]
+
+        missing_user_ids = [uid for uid in user_ids if uid not in results]
+        results.update(self._parallel_per_user(missing_user_ids, fetch))
+        return {uid: results[uid] for uid in user_ids if results[uid]}
 
     def _query_struggles(self, user_ids: List[str], start_time: datetime, end_time: datetime) -> List[Dict]:
         """
         Query review items (formerly struggles) from the new reviewItems collection.
         Returns items with normalized field names for backwards compatibility with analytics.
         """
-        items = []
-        for user_id in user_ids:
+        def fetch(user_id: str) -> List[Dict]:
             # Query new reviewItems collection
             query = (
                 self._db.collection('users').document(user_id)
@@ -241,79 +608,93 @@ Respond with ONLY valid JSON:
                 .where('createdAt', '>=', start_time)
                 .where('createdAt', '<=', end_time)
             )
+            user_items = []
             for doc in query.stream():
                 data = doc.to_dict()
                 data['userId'] = user_id
                 data['id'] = doc.id
-                items.append(data)
+                user_items.append(data)
+            return user_items
+
+        results = self._parallel_per_user(user_ids, fetch)
+        items = []
+        for user_id in user_ids:
+            items.extend(results[user_id])
         return items
 
     def _aggregate_by_level(
-        self, mission_map, sessions, prev_sessions, users, session_summaries, prev_summaries, struggles
+        self, mission_map, sessions, prev_session_counts, users, session_summaries, prev_star_totals, struggles
     ) -> Dict[str, Dict]:
-        level_data = {level: {
-            'sessions': [], 'prev_sessions': [], 'user_ids': set(),
-            'struggles': [], 'summaries': [], 'prev_summaries': []
-        } for level in self.CEFR_LEVELS}
+        level_data = {level: LevelBucket() for level in self.CEFR_LEVELS}
+        get_bucket = level_data.get
+
+        # Resolve levels once per mission/user instead of once per row
+        mission_level = {mid: m.get('targetLevel', 'B1') for mid, m in mission_map.items()}.get
+        user_level = {uid: u.get('level', 'B1') for uid, u in users.items()}.get
 
         for session in sessions:
-            mission = mission_map.get(session.get('missionId'), {})
-            target_level = mission.get('targetLevel', 'B1')
-            if target_level in level_data:
-                level_data[target_level]['sessions'].append(session)
+            bucket = get_bucket(session.get('targetLevel') or mission_level(session.get('missionId'), 'B1'))
+            if bucket is not None:
+                bucket.sessions.append(session)
                 if session.get('userId'):
-                    level_data[target_level]['user_ids'].add(session['userId'])
-
-        for session in prev_sessions:
-            mission = mission_map.get(session.get('missionId'), {})
-            target_level = mission.get('targetLevel', 'B1')
-            if target_level in level_data:
-                level_data[target_level]['prev_sessions'].append(session)
+                    bucket.user_ids.add(session['userId'])
 
         for struggle in struggles:
-            user_level = users.get(struggle.get('userId'), {}).get('level', 'B1')
-            if user_level in level_data:
-                level_data[user_level]['struggles'].append(struggle)
+            bucket = get_bucket(user_level(struggle.get('userId'), 'B1'))
+            if bucket is not None:
+                bucket.struggles.append(struggle)
 
         for user_id, user_summaries in session_summaries.items():
-            user_level = users.get(user_id, {}).get('level', 'B1')
-            if user_level in level_data:
-                level_data[user_level]['summaries'].extend(user_summaries)
-
-        for user_id, user_summaries in prev_summaries.items():
-            user_level = users.get(user_id, {}).get('level', 'B1')
-            if user_level in level_data:
-                level_data[user_level]['prev_summaries'].extend(user_summaries)
+            bucket = get_bucket(user_level(user_id, 'B1'))
+            if bucket is not None:
+                # Reduce in one pass instead of collecting summaries per level
+                for summary in user_summaries:
+                    stars = summary.get('stars')
+                    if stars:
+                        bucket.star_sum += stars
+                        bucket.star_count += 1
+                    bucket.duration_seconds += summary.get('duration', 0)
+
+        for user_level, (star_sum, star_count) in prev_star_totals.items():
+            bucket = get_bucket(user_level)
+            if bucket is not None:
+                bucket.prev_star_sum += star_sum
+                bucket.prev_star_count += star_count
 
         by_level = {}
         for level, data in level_data.items():
-            if not data['sessions'] and not data['user_ids']:
+            if not data.sessions and not data.user_ids:
                 continue
 
-            session_count = len(data['sessions'])
-            prev_session_count = len(data['prev_sessions'])
-            student_count = len(data['user_ids'])
+            session_count = len(data.sessions)
+            prev_session_count = prev_session_counts.get(level, 0)
+            student_count = len(data.user_ids)
 
-            stars = [s.get('stars', 0) for s in data['summaries'] if s.get('stars')]
-            avg_stars = sum(stars) / len(stars) if stars else 0
-            prev_stars = [s.get('stars', 0) for s in data['prev_summaries'] if s.get('stars')]
-            prev_avg_stars = sum(prev_stars) / len(prev_stars) if prev_stars else 0
+            avg_stars = data.star_sum / data.star_count if data.star_count else 0
+            prev_avg_stars = data.prev_star_sum / data.prev_star_count if data.prev_star_count else 0
 
-            minutes = sum(s.get('duration', 0) / 60 for s in data['summaries'])
+            minutes = data.duration_seconds / 60
 
             by_level[level] = {
                 "studentCount": student_count,
                 "sessionCount": session_count,
                 "avgStars": round(avg_stars, 2),
                 "totalPracticeMinutes": round(minutes),
-                "wordsMastered": self._count_mastered_words(list(data['user_ids'])),
+                "wordsMastered": self._count_mastered_words(list(data.user_ids)),
                 "trends": self._calculate_trends(session_count, prev_session_count, avg_stars, prev_avg_stars),
-                "lessons": self._aggregate_lessons(data['sessions'], mission_map, data['struggles']),
-                "students": self._aggregate_students(list(data['user_ids']), users, session_summaries),
-                "topStruggles": self._aggregate_struggles(data['struggles'])
+                "lessons": self._aggregate_lessons(data.sessions, mission_map, data.struggles),
+                "students": self._aggregate_students(list(data.user_ids), users, session_summaries),
+                "topStruggles": self._aggregate_struggles(data.struggles)
             }
         return by_level
 
+    def _session_level(self, session: Dict, mission_map: Dict[str, Dict]) -> str:
+        """Level of a session: denormalized targetLevel, else joined from its mission (older docs)."""
+        target_level = session.get('targetLevel')
+        if target_level:
+            return target_level
+        return mission_map.get(session.get('missionId'), {}).get('targetLevel', 'B1')
+
     def _calculate_trends(self, curr_sessions, prev_sessions, curr_stars, prev_stars) -> Dict[str, str]:
         if prev_sessions > 0:
             change = ((curr_sessions - prev_sessions) / prev_sessions) * 100
@@ -334,49 +715,56 @@ Respond with ONLY valid JSON:
         Aggregate lesson statistics including review items (formerly struggles).
         Updated to use new reviewItems schema with errorType, userSentence, correction.
         """
-        stats = defaultdict(lambda: {'completions': 0, 'stars': [], 'review_items': [], 'user_ids': set()})
+        stats = defaultdict(lambda: {'completions': 0, 'star_sum': 0, 'star_count': 0, 'review_items': [], 'user_ids': set()})
         for session in sessions:
             mid = session.get('missionId')
             if mid:
-                stats[mid]['completions'] += 1
-                if session.get('stars'):
-                    stats[mid]['stars'].append(session['stars'])
+                lesson = stats[mid]
+                lesson['completions'] += 1
+                stars = session.get('stars')
+                if stars:
+                    lesson['star_sum'] += stars
+                    lesson['star_count'] += 1
                 if session.get('userId'):
-                    stats[mid]['user_ids'].add(session['userId'])
+                    lesson['user_ids'].add(session['userId'])
 
         # Link review items to lessons based on which lessons the student did
         if review_items:
+            # Fallback target per user: the first lesson they appear in (first wins)
+            user_first_mission = {}
+            for mid, data in stats.items():
+                for uid in data['user_ids']:
+                    user_first_mission.setdefault(uid, mid)
+
             for item in review_items:
                 user_id = item.get('userId')
                 mission_id = item.get('missionId')  # Direct link if available
                 if mission_id and mission_id in stats:
                     stats[mission_id]['review_items'].append(item)
-                elif user_id:
-                    # Fallback: attribute to lessons this user participated in
-                    for mid, data in stats.items():
-                        if user_id in data['user_ids']:
-                            stats[mid]['review_items'].append(item)
-                            break  # Only attribute to one lesson
+                elif user_id in user_first_mission:
+                    # Fallback: attribute to one lesson this user participated in
+                    stats[user_first_mission[user_id]]['review_items'].append(item)
 
+        # Only the 10 most-completed lessons are returned, so build just those
         lessons = []
-        for mid, s in stats.items():
+        for mid, s in heapq.nlargest(10, stats.items(), key=lambda kv: kv[1]['completions']):
             mission = mission_map.get(mid, {})
-            avg = sum(s['stars']) / len(s['stars']) if s['stars'] else 0
+            avg = s['star_sum'] / s['star_count'] if s['star_count'] else 0
 
             # Aggregate corrections for this lesson (new field name)
             # Use correction for display, truncated for readability
-            correction_counts = defaultdict(int)
-            for item in s['review_items']:
-                # Use correction (new) or fall back to userSentence truncated
-                display_text = item.get('correction', item.get('userSentence', ''))[:40]
-                if display_text:
-                    correction_counts[display_text] += 1
-
-            top_struggles = sorted(
-                [{'word': w, 'count': c} for w, c in correction_counts.items()],
-                key=lambda x: x['count'],
-                reverse=True
-            )[:5]
+            # (fall back to userSentence when there is no correction).
+            # Interned so repeated sentences share one key object.
+            correction_counts = Counter(
+                display_text
+                for display_text in (
+                    intern(item.get('correction', item.get('userSentence', ''))[:40])
+                    for item in s['review_items']
+                )
+                if display_text
+            )
+
+            top_struggles = [{'word': w, 'count': c} for w, c in correction_counts.most_common(5)]
 
             lessons.append({
                 "missionId": mid,
@@ -387,27 +775,29 @@ Respond with ONLY valid JSON:
                 "struggleCount": len(s['review_items']),
                 "topStruggles": top_struggles
             })
-        lessons.sort(key=lambda x: x['completions'], reverse=True)
-        return lessons[:10]
+        return lessons
 
     def _aggregate_students(self, user_ids, users, session_summaries) -> List[Dict]:
         students = []
-        now = datetime.now(timezone.utc)
+        # Computed once per call: bisect over the thresholds replaces the
+        # per-student if/else chain (days <= ACTIVE -> 0, <= WARNING -> 1, else 2)
+        now_ts = time.time()
+        thresholds = (self.ACTIVE_THRESHOLD, self.WARNING_THRESHOLD)
         for uid in user_ids:
             user = users.get(uid, {})
             summaries = session_summaries.get(uid, [])
             last = user.get('lastSessionAt')
-            days = 999
-            if last:
-                if hasattr(last, 'timestamp'):
-                    last_dt = datetime.fromtimestamp(last.timestamp(), tz=timezone.utc)
-                else:
-                    last_dt = last.replace(tzinfo=timezone.utc) if last.tzinfo is None else last
-                days = (now - last_dt).days
-
-            status = "active" if days <= self.ACTIVE_THRESHOLD else "warning" if days <= self.WARNING_THRESHOLD else "inactive"
-            stars = [s.get('stars', 0) for s in summaries if s.get('stars')]
-            avg = sum(stars) / len(stars) if stars else 0
+            days = int((now_ts - last.timestamp()) // 86400) if last else 999
+
+            status = self._ACTIVITY_STATUS_LABELS[bisect_left(thresholds, days)]
+            star_sum = 0
+            star_count = 0
+            for summary in summaries:
+                summary_stars = summary.get('stars')
+                if summary_stars:
+                    star_sum += summary_stars
+                    star_count += 1
+            avg = star_sum / star_count if star_count else 0
             adv = len(summaries) >= self.ADVANCEMENT_MIN_SESSIONS and avg >= self.ADVANCEMENT_MIN_AVG_STARS
 
             students.append({
@@ -428,23 +818,26 @@ Respond with ONLY valid JSON:
         Aggregate review items (formerly struggles) for display.
         Updated to use new schema: errorType, userSentence, correction, severity (1-10).
         """
-        counts = defaultdict(lambda: {'count': 0, 'type': 'Vocabulary', 'severities': []})
+        counts = {}
         for item in review_items:
             # Use correction as the display text (what they should say)
             # Fall back to userSentence if correction not available
-            text = item.get('correction', item.get('userSentence', ''))[:50]  # Truncate for display
+            # Truncate for display; interned so repeated sentences share one key object
+            text = intern(item.get('correction', item.get('userSentence', ''))[:50])
             if text:
-                counts[text]['count'] += 1
-                counts[text]['type'] = item.get('errorType', 'Vocabulary')
+                data = counts.get(text)
+                if data is None:
+                    data = counts[text] = {'count': 0, 'type': 'Vocabulary', 'severity_sum': 0}
+                data['count'] += 1
+                data['type'] = item.get('errorType', 'Vocabulary')
                 # New severity is 1-10 integer
-                severity = item.get('severity', 5)
-                counts[text]['severities'].append(severity)
+                data['severity_sum'] += item.get('severity', 5)
 
         result = []
-        for text, data in counts.items():
+        for text, data in heapq.nlargest(15, counts.items(), key=lambda kv: kv[1]['count']):
             # Map 1-10 scale to low/medium/high
             # 1-3 = low, 4-6 = medium, 7-10 = high
-            avg_severity = sum(data['severities']) / len(data['severities']) if data['severities'] else 5
+            avg_severity = data['severity_sum'] / data['count']
             if avg_severity >= 7:
                 sev = "high"
             elif avg_severity >= 4:
@@ -452,17 +845,27 @@ Respond with ONLY valid JSON:
             else:
                 sev = "low"
             result.append({"text": text, "type": data['type'], "count": data['count'], "severity": sev})
-        result.sort(key=lambda x: x['count'], reverse=True)
-        return result[:15]
+        return result
 
     def _count_mastered_words(self, user_ids) -> int:
-        """Count mastered review items from new reviewItems collection."""
-        count = 0
-        for uid in user_ids:
-            # Use new reviewItems collection
-            query = self._db.collection('users').document(uid).collection('reviewItems').where('mastered', '==', True)
-            count += len(list(query.stream()))
-        return count
+        """
+        Count mastered review items from new reviewItems collection.
+
+        One collection-group count() per 30 users (the `in` limit) instead of
+        one per user; every reviewItems doc carries its owner's userId.
+        """
+        user_ids = list(user_ids)
+
+        def count_batch(start: int) -> int:
+            query = (
+                self._db.collection_group('reviewItems')
+                .where('mastered', '==', True)
+                .where('userId', 'in', user_ids[start:start+30])
+            )
+            # Server-side count aggregation - returns a single scalar instead of every document
+            return int(self._run_aggregation(query.count(alias='count')).get('count') or 0)
+
+        return sum(_per_user_executor.map(count_batch, range(0, len(user_ids), 30)))
 
     def _calculate_cost(self, input_tokens: int, output_tokens: int) -> float:
         """Calculate cost from token counts using Gemini 2.5 Flash Native Audio pricing."""
@@ -473,6 +876,7 @@ Respond with ONLY valid JSON:
 
     def _aggregate_costs(
         self,
+        teacher_id: str,
         user_ids: List[str],
         start_time: datetime,
         end_time: datetime,
@@ -483,8 +887,10 @@ Respond with ONLY valid JSON:
         Aggregate cost data from user sessions subcollection.
 
         Architecture:
-        - New structure: users/{userId}/sessions/{sessionId}
-        - Fallback: Old root tokenUsage collection for backwards compatibility
+        - New structure: users/{userId}/sessions/{sessionId}, read for the whole
+          class with one collection-group query on the denormalized teacherId
+        - Per-user fallback for students without matching sessions (older docs
+          without teacherId, or the old root tokenUsage collection)
 
         Returns:
             (costs_summary, student_costs_list)
@@ -493,7 +899,147 @@ Respond with ONLY valid JSON:
         total_output_tokens = 0
         student_costs = []
 
+        token_totals = self._token_usage_by_user(teacher_id, user_ids, start_time, end_time)
+
         for user_id in user_ids:
+            if token_totals.get(user_id) is None:
+                continue
+            user_input_tokens, user_output_tokens, session_count = token_totals[user_id]
+
+            if session_count > 0 or user_input_tokens > 0 or user_output_tokens > 0:
+                user_cost = self._calculate_cost(user_input_tokens, user_output_tokens)
+                total_input_tokens += user_input_tokens
+                total_output_tokens += user_output_tokens
+
+                student_costs.append({
+                    'userId': user_id,
+                    'displayName': users.get(user_id, {}).get('displayName', 'Student'),
+                    'totalCost': round(user_cost, 4),
+                    'sessionCount': session_count,
+                    'avgCostPerSession': round(user_cost / session_count, 4) if session_count > 0 else 0,
+                    'inputTokens': user_input_tokens,
+                    'outputTokens': user_output_tokens
+                })
+
+        # Sort by total cost descending
+        student_costs.sort(key=lambda x: x['totalCost'], reverse=True)
+
+        # Calculate totals
+        total_cost = self._calculate_cost(total_input_tokens, total_output_tokens)
+        student_count = len([s for s in student_costs if s['totalCost'] > 0])
+
+        # Calculate daily/monthly costs based on period
+        if period == "week":
+            days_in_period = 7
+        elif period == "month":
+            days_in_period = 30
+        else:
+            # All-time: calculate based on actual date range
+            days_in_period = max(1, (end_time - start_time).days)
+
+        daily_cost = total_cost / days_in_period if days_in_period > 0 else 0
+        monthly_cost = daily_cost * 30
+
+        costs = {
+            'totalCost': round(total_cost, 4),
+            'inputTokens': total_input_tokens,
+            'outputTokens': total_output_tokens,
+            'costPerStudent': round(total_cost / student_count, 4) if student_count > 0 else 0,
+            'dailyCost': round(daily_cost, 4),
+            'monthlyCost': round(monthly_cost, 4)
+        }
+
+        return costs, student_costs
+
+    def _token_usage_by_user(
+        self,
+        teacher_id: str,
+        user_ids: List[str],
+        start_time: datetime,
+        end_time: datetime
+    ) -> Dict[str, Optional[tuple]]:
+        """
+        Token usage per student: {user_id: (input_tokens, output_tokens, session_count)},
+        None where a query failed.
+
+        Closed UTC days on or after DAILY_TOKEN_TOTALS_SINCE are read from the
+        users/{uid}/tokenTotalsDaily rollups; only the partial days at the edges
+        of the window (and anything before the cutover) scan raw sessions.
+        """
+        since = config.DAILY_TOKEN_TOTALS_SINCE
+        start_day = start_time.date()
+        if start_time != datetime(start_day.year, start_day.month, start_day.day, tzinfo=timezone.utc):
+            start_day += timedelta(days=1)
+        first_day = max(start_day, since) if since else None
+        end_day = end_time.date()  # Today is still open, so it is never read from rollups
+
+        if first_day is None or first_day >= end_day:
+            return self._scan_token_usage(teacher_id, user_ids, start_time, end_time)
+
+        covered_start = datetime(first_day.year, first_day.month, first_day.day, tzinfo=timezone.utc)
+        covered_end = datetime(end_day.year, end_day.month, end_day.day, tzinfo=timezone.utc)
+
+        # The edge windows scan raw sessions the same way as uncovered ranges,
+        # so untagged sessions are not dropped there either
+        parts = [
+            self._read_daily_token_totals(user_ids, first_day, end_day),
+            self._scan_token_usage(teacher_id, user_ids, covered_end, end_time)
+        ]
+        if start_time < covered_start:
+            before_end = covered_start - timedelta(microseconds=1)
+            parts.append(self._scan_token_usage(teacher_id, user_ids, start_time, before_end))
+
+        token_totals = {}
+        for part in parts:
+            for user_id, totals in part.items():
+                if user_id in token_totals and (token_totals[user_id] is None or totals is None):
+                    token_totals[user_id] = None
+                elif user_id in token_totals:
+                    token_totals[user_id] = tuple(a + b for a, b in zip(token_totals[user_id], totals))
+                else:
+                    token_totals[user_id] = totals
+        return token_totals
+
+    def _read_daily_token_totals(self, user_ids: List[str], first_day: date, end_day: date) -> Dict[str, tuple]:
+        """Sum users/{uid}/tokenTotalsDaily docs for days in [first_day, end_day) with batched get_all."""
+        day_keys = [(first_day + timedelta(days=i)).isoformat() for i in range((end_day - first_day).days)]
+        users_col = self._db.collection('users')
+        refs = [
+            users_col.document(uid).collection('tokenTotalsDaily').document(day_key)
+            for uid in user_ids
+            for day_key in day_keys
+        ]
+
+        totals = {}
+        for i in range(0, len(refs), self.GET_ALL_BATCH_SIZE):
+            for doc in self._db.get_all(refs[i:i+self.GET_ALL_BATCH_SIZE]):
+                if not doc.exists:
+                    continue
+                user_id = doc.reference.parent.parent.id
+                data = doc.to_dict()
+                input_tokens, output_tokens, session_count = totals.get(user_id, (0, 0, 0))
+                totals[user_id] = (
+                    input_tokens + data.get('inputTokens', 0),
+                    output_tokens + data.get('outputTokens', 0),
+                    session_count + data.get('sessionCount', 0)
+                )
+        return totals
+
+    def _scan_token_usage(
+        self,
+        teacher_id: str,
+        user_ids: List[str],
+        start_time: datetime,
+        end_time: datetime
+    ) -> Dict[str, Optional[tuple]]:
+        """
+        Token usage per student from raw session docs. Windows covered by
+        TEACHER_ID_TAGGED_SINCE use the class collection-group query, with a
+        per-user scan for students it misses; older windows may hold sessions
+        without teacherId, so every student is scanned per user.
+        """
+        def sum_tokens(user_id: str) -> Optional[tuple]:
+            """Returns (input_tokens, output_tokens, session_count), or None on error."""
             try:
                 user_input_tokens = 0
                 user_output_tokens = 0
@@ -528,62 +1074,72 @@ Respond with ONLY valid JSON:
                         user_output_tokens += data.get('outputTokens', 0)
                         session_count += 1
 
-                if session_count > 0 or user_input_tokens > 0 or user_output_tokens > 0:
-                    user_cost = self._calculate_cost(user_input_tokens, user_output_tokens)
-                    total_input_tokens += user_input_tokens
-                    total_output_tokens += user_output_tokens
-
-                    student_costs.append({
-                        'userId': user_id,
-                        'displayName': users.get(user_id, {}).get('displayName', 'Student'),
-                        'totalCost': round(user_cost, 4),
-                        'sessionCount': session_count,
-                        'avgCostPerSession': round(user_cost / session_count, 4) if session_count > 0 else 0,
-                        'inputTokens': user_input_tokens,
-                        'outputTokens': user_output_tokens
-                    })
+                return user_input_tokens, user_output_tokens, session_count
 
             except Exception as e:
                 print(f"[Analytics] Error querying token usage for {user_id}: {e}", flush=True)
+                return None
 
-        # Sort by total cost descending
-        student_costs.sort(key=lambda x: x['totalCost'], reverse=True)
-
-        # Calculate totals
-        total_cost = self._calculate_cost(total_input_tokens, total_output_tokens)
-        student_count = len([s for s in student_costs if s['totalCost'] > 0])
-
-        # Calculate daily/monthly costs based on period
-        if period == "week":
-            days_in_period = 7
-        elif period == "month":
-            days_in_period = 30
+        if self._teacher_tagged(start_time):
+            token_totals = self._sum_class_tokens(teacher_id, user_ids, start_time, end_time)
         else:
-            # All-time: calculate based on actual date range
-            days_in_period = max(1, (end_time - start_time).days)
-
-        daily_cost = total_cost / days_in_period if days_in_period > 0 else 0
-        monthly_cost = daily_cost * 30
+            token_totals = {}
+        missing_user_ids = [uid for uid in user_ids if uid not in token_totals]
+        token_totals.update(self._parallel_per_user(missing_user_ids, sum_tokens))
+        return token_totals
 
-        costs = {
-            'totalCost': round(total_cost, 4),
-            'inputTokens': total_input_tokens,
-            'outputTokens': total_output_tokens,
-            'costPerStudent': round(total_cost / student_count, 4) if student_count > 0 else 0,
-            'dailyCost': round(daily_cost, 4),
-            'monthlyCost': round(monthly_cost, 4)
-        }
+    def _sum_class_tokens(
+        self,
+        teacher_id: str,
+        user_ids: List[str],
+        start_time: datetime,
+        end_time: datetime
+    ) -> Dict[str, tuple]:
+        """
+        Sum token usage per student with a single collection-group query over
+        users/*/sessions. Returns {user_id: (input_tokens, output_tokens, session_count)}
+        for students that had at least one matching session.
 
-        return costs, student_costs
+        The collection group also matches root sessions/{id} docs, which the
+        client tags with teacherId too; those have no parent doc and are skipped.
+        """
+        wanted = set(user_ids)
+        totals = {}
+        try:
+            query = (
+                self._db.collection_group('sessions')
+                .where('teacherId', '==', teacher_id)
+                .where('startTime', '>=', start_time)
+                .where('startTime', '<=', end_time)
+                .select(['userId', 'inputTokens', 'outputTokens'])
+            )
+            for doc in query.stream():
+                if doc.reference.parent.parent is None:
+                    continue
+                data = doc.to_dict()
+                user_id = data.get('userId')
+                if user_id not in wanted:
+                    continue
+                input_tokens, output_tokens, session_count = totals.get(user_id, (0, 0, 0))
+                totals[user_id] = (
+                    input_tokens + data.get('inputTokens', 0),
+                    output_tokens + data.get('outputTokens', 0),
+                    session_count + 1
+                )
+        except Exception as e:
+            print(f"[Analytics] Error querying class token usage for teacher {teacher_id}: {e}", flush=True)
+            return {}
+        return totals
 
     def _calculate_totals(self, by_level) -> Dict:
-        totals = {"studentCount": 0, "sessionCount": 0, "avgStars": 0, "totalPracticeMinutes": 0, "wordsMastered": 0}
+        totals = {"studentCount": 0, "sessionCount": 0, "avgStars": 0, "totalPracticeMinutes": 0, "wordsMastered": 0, "struggleCount": 0}
         star_sum, level_count = 0, 0
         for data in by_level.values():
             totals["studentCount"] += data.get("studentCount", 0)
             totals["sessionCount"] += data.get("sessionCount", 0)
             totals["totalPracticeMinutes"] += data.get("totalPracticeMinutes", 0)
             totals["wordsMastered"] += data.get("wordsMastered", 0)
+            totals["struggleCount"] += len(data.get("topStruggles", []))
             if data.get("avgStars", 0) > 0:
                 star_sum += data["avgStars"]
                 level_count += 1
@@ -593,13 +1149,24 @@ Respond with ONLY valid JSON:
     def _detect_cross_level_insights(self, sessions, users, struggles, mission_map) -> Dict:
         insights = {"advancementCandidates": [], "levelMismatches": [], "universalStruggles": []}
 
-        user_struggles = defaultdict(list)
+        # One pass over struggles builds every aggregate below
+        user_struggle_counts = Counter()
+        user_significant_counts = Counter()
+        struggle_levels = defaultdict(set)
+        struggle_counts = Counter()
         for s in struggles:
-            user_struggles[s.get('userId')].append(s)
+            uid = s.get('userId')
+            user_struggle_counts[uid] += 1
+            if s.get('severity') == 'significant':
+                user_significant_counts[uid] += 1
+            word = s.get('word', '')
+            if word:
+                struggle_levels[word].add(users.get(uid, {}).get('level', 'B1'))
+                struggle_counts[word] += 1
 
-        for uid, ustruggles in user_struggles.items():
-            if len(ustruggles) >= self.MISMATCH_STRUGGLE_THRESHOLD:
-                sig_count = sum(1 for s in ustruggles if s.get('severity') == 'significant')
+        for uid, struggle_count in user_struggle_counts.items():
+            if struggle_count >= self.MISMATCH_STRUGGLE_THRESHOLD:
+                sig_count = user_significant_counts[uid]
                 if sig_count >= 2:
                     insights["levelMismatches"].append({
                         "userId": uid,
@@ -608,22 +1175,16 @@ Respond with ONLY valid JSON:
                         "evidence": f"{sig_count} significant struggles"
                     })
 
-        struggle_levels = defaultdict(set)
-        for s in struggles:
-            word = s.get('word', '')
-            user_level = users.get(s.get('userId'), {}).get('level', 'B1')
-            if word:
-                struggle_levels[word].add(user_level)
-
         for word, levels in struggle_levels.items():
             if len(levels) >= 2:
                 insights["universalStruggles"].append({
                     "text": word,
-                    "affectedLevels": sorted(list(levels)),
-                    "totalCount": sum(1 for s in struggles if s.get('word') == word)
+                    "affectedLevels": sorted(levels),
+                    "totalCount": struggle_counts[word]
                 })
-        insights["universalStruggles"].sort(key=lambda x: len(x["affectedLevels"]), reverse=True)
-        insights["universalStruggles"] = insights["universalStruggles"][:10]
+        insights["universalStruggles"] = heapq.nlargest(
+            10, insights["universalStruggles"], key=lambda x: len(x["affectedLevels"])
+        )
         return insights
 
     def _empty_response(self, period: str) -> Dict:
@@ -631,10 +1192,131 @@ Respond with ONLY valid JSON:
             "period": period,
             "generatedAt": datetime.now(timezone.utc).isoformat(),
             "byLevel": {},
-            "totals": {"studentCount": 0, "sessionCount": 0, "avgStars": 0, "totalPracticeMinutes": 0, "wordsMastered": 0},
+            "totals": {"studentCount": 0, "sessionCount": 0, "avgStars": 0, "totalPracticeMinutes": 0, "wordsMastered": 0, "struggleCount": 0},
             "crossLevelInsights": {"advancementCandidates": [], "levelMismatches": [], "universalStruggles": []}
         }
 
+    # ==================== DAILY ANALYTICS SNAPSHOTS ====================
+
+    def build_daily_snapshot(self, teacher_id: str, day: date, batch=None) -> Dict[str, Any]:
+        """
+        Materialize one UTC day of trend inputs to
+        teachers/{teacherId}/analyticsSnapshots/{YYYY-MM-DD}.
+
+        Past days never change, so previous-period trends can sum these
+        documents instead of re-aggregating raw sessions on every request.
+        When a WriteBatch is passed the write is queued on it instead of
+        being sent immediately.
+        """
+        day_start = datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+        day_end = day_start + timedelta(days=1) - timedelta(microseconds=1)
+
+        by_level = {}
+        mission_map = {m.id: m.to_dict() for m in self._query_missions(teacher_id, "all")}
+        if mission_map:
+            sessions = self._query_sessions(mission_map, day_start, day_end)
+            for session in sessions:
+                level_stats = by_level.setdefault(
+                    self._session_level(session, mission_map),
+                    {'sessionCount': 0, 'starSum': 0, 'starCount': 0}
+                )
+                level_stats['sessionCount'] += 1
+
+            for user_level, (star_sum, star_count) in self._class_star_totals(teacher_id, day_start, day_end).items():
+                level_stats = by_level.setdefault(user_level, {'sessionCount': 0, 'starSum': 0, 'starCount': 0})
+                level_stats['starSum'] += star_sum
+                level_stats['starCount'] += star_count
+
+        snapshot = {
+            'date': day.isoformat(),
+            'byLevel': by_level,
+            'generatedAt': datetime.now(timezone.utc)
+        }
+        snapshot_ref = self._db.document(f'teachers/{teacher_id}/analyticsSnapshots/{day.isoformat()}')
+        if batch is not None:
+            batch.set(snapshot_ref, snapshot)
+        else:
+            snapshot_ref.set(snapshot)
+        return snapshot
+
+    def generate_daily_snapshots(self, day: Optional[date] = None) -> Dict[str, int]:
+        """
+        Build daily snapshots for every teacher. Defaults to yesterday (UTC).
+
+        Returns counts of teachers processed and errors.
+        """
+        day = day or (datetime.now(timezone.utc) - timedelta(days=1)).date()
+        teachers_processed = 0
+        errors = 0
+
+        # Snapshot writes are queued and committed SNAPSHOT_WRITE_BATCH_SIZE at a time
+        batch = self._db.batch()
+        pending = 0
+
+        def commit_pending() -> int:
+            try:
+                batch.commit()
+                return 0
+            except Exception as e:
+                print(f"[Analytics] Error committing {pending} snapshots: {e}", flush=True)
+                return pending
+
+        teachers_query = self._db.collection('users').where('role', '==', 'teacher').select([])
+        for teacher_doc in teachers_query.stream():
+            teachers_processed += 1
+            try:
+                self.build_daily_snapshot(teacher_doc.id, day, batch)
+                pending += 1
+            except Exception as e:
+                print(f"[Analytics] Error building snapshot for teacher {teacher_doc.id}: {e}", flush=True)
+                errors += 1
+            if pending >= self.SNAPSHOT_WRITE_BATCH_SIZE:
+                errors += commit_pending()
+                batch = self._db.batch()
+                pending = 0
+        if pending:
+            errors += commit_pending()
+        print(f"[Analytics] Snapshots for {day.isoformat()}: {teachers_processed} teachers, {errors} errors", flush=True)
+        return {'teachersProcessed': teachers_processed, 'errors': errors}
+
+    def _load_snapshot_trend_inputs(
+        self,
+        teacher_id: str,
+        prev_start: datetime,
+        prev_end: datetime
+    ) -> Optional[tuple]:
+        """
+        Sum the daily snapshots covering the previous period (whole UTC days,
+        see _get_previous_period).
+
+        Returns (session_counts_by_level, star_totals_by_level), or None if any
+        day is missing so the caller falls back to live aggregation.
+        """
+        first_day = prev_start.date()
+        num_days = (prev_end.date() - first_day).days + 1
+        if num_days <= 0:
+            return None
+
+        snapshots_col = self._db.collection('teachers').document(teacher_id).collection('analyticsSnapshots')
+        refs = [snapshots_col.document((first_day + timedelta(days=i)).isoformat()) for i in range(num_days)]
+
+        session_counts = defaultdict(int)
+        star_totals = {}
+        found = 0
+        for i in range(0, len(refs), self.GET_ALL_BATCH_SIZE):
+            for doc in self._db.get_all(refs[i:i+self.GET_ALL_BATCH_SIZE]):
+                if not doc.exists:
+                    return None
+                found += 1
+                for level, stats in (doc.to_dict().get('byLevel') or {}).items():
+                    session_counts[level] += stats.get('sessionCount', 0)
+                    level_sum, level_count = star_totals.get(level, (0, 0))
+                    star_totals[level] = (level_sum + stats.get('starSum', 0), level_count + stats.get('starCount', 0))
+
+        if found < num_days:
+            return None
+        return dict(session_counts), star_totals
+
     # ==================== CLASS PULSE (AI-GENERATED INSIGHTS) ====================
 
     def generate_class_pulse(
@@ -660,33 +1342,54 @@ Respond with ONLY valid JSON:
         today = datetime.now(timezone.utc).strftime('%Y-%m-%d')
         insights_ref = self._db.document(f'teachers/{teacher_id}/dailyInsights/{today}')
 
+        # Today's insights doc and the live activity counters in one round trip
+        counters_ref = self._live_counters_ref(teacher_id)
+        docs = {doc.reference.path: doc for doc in self._db.get_all([insights_ref, counters_ref])}
+        existing, counters_doc = docs[insights_ref.path], docs[counters_ref.path]
+        live_counters = counters_doc.to_dict() if counters_doc.exists else None
+
         # Check if we should regenerate (smart triggering)
+        analytics = None
         if not force:
-            should_regen, reason = self._should_regenerate_insights(teacher_id, insights_ref)
+            should_regen, reason, analytics = self._should_regenerate_insights(teacher_id, existing, live_counters)
             if not should_regen:
                 print(f"[ClassPulse] Skipping regeneration: {reason}", flush=True)
                 # Just update the stillValidAt timestamp
-                existing = insights_ref.get()
                 if existing.exists:
                     insights_ref.update({'stillValidAt': datetime.now(timezone.utc)})
+                    self._invalidate_pulse_cache(teacher_id)
                     data = existing.to_dict()
                     data['skippedReason'] = reason
                     return data
                 # No existing insights and no new data - return empty
                 return self._empty_pulse_response(reason)
 
-        # Get analytics data for the prompt
-        analytics = self.get_teacher_analytics(teacher_id, period="week", level="all")
+        # Get analytics data for the prompt (already loaded by the trigger check)
+        if analytics is None:
+            analytics = self.get_teacher_analytics(teacher_id, period="week", level="all")
 
         if analytics['totals']['sessionCount'] == 0:
             print(f"[ClassPulse] No session data for teacher {teacher_id}", flush=True)
             return self._empty_pulse_response("No class activity in the past week")
 
-        # Format data for Gemini
+        # Format data for Gemini, compacted when a large class would bloat the prompt
         class_data = self._format_class_data_for_gemini(teacher_id, analytics)
-
-        # Generate insights with Gemini 2.5 Pro
-        insights = self._call_gemini_for_insights(class_data)
+        if len(class_data) > self.PULSE_CLASS_DATA_MAX_CHARS:
+            class_data = self._format_class_data_for_gemini(
+                teacher_id, analytics, students_per_level=self.PULSE_COMPACT_STUDENTS_PER_LEVEL
+            )
+        input_hash = hashlib.sha256(class_data.encode('utf-8')).hexdigest()
+
+        # Same prompt input as today's or yesterday's run -> reuse those insights
+        cached_insights = self._find_cached_insights(teacher_id, insights_ref, input_hash)
+        if cached_insights is not None:
+            print(f"[ClassPulse] Input unchanged (hash {input_hash[:12]}), reusing cached insights", flush=True)
+            insights = cached_insights
+            is_new = False
+        else:
+            # Generate insights with Gemini 2.5 Pro
+            insights = self._call_gemini_for_insights(class_data)
+            is_new = True
 
         # Save to Firestore
         now = datetime.now(timezone.utc)
@@ -696,14 +1399,25 @@ Respond with ONLY valid JSON:
             'stillValidAt': now,
             'dataSnapshot': {
                 'totalSessions': analytics['totals']['sessionCount'],
-                'totalStruggles': sum(
-                    len(level.get('topStruggles', []))
-                    for level in analytics['byLevel'].values()
-                ),
+                'totalStruggles': analytics['totals']['struggleCount'],
                 'lastGeneratedAt': now
             }
         }
-        insights_ref.set(pulse_data)
+        if live_counters is not None:
+            pulse_data['dataSnapshot']['liveSessionCount'] = live_counters.get('sessionCount', 0)
+            pulse_data['dataSnapshot']['liveStruggleCount'] = live_counters.get('struggleCount', 0)
+        # Never key the cache on a failed call, so the next run retries Gemini
+        batch = self._db.batch()
+        if insights != self._fallback_insights():
+            pulse_data['inputHash'] = input_hash
+            if is_new:
+                batch.set(self._insights_by_hash_ref(teacher_id, input_hash), {
+                    'insights': insights,
+                    'createdAt': now
+                })
+        batch.set(insights_ref, pulse_data)
+        batch.commit()
+        self._invalidate_pulse_cache(teacher_id)
 
         print(f"[ClassPulse] Generated {len(insights)} insights for teacher {teacher_id}", flush=True)
 
@@ -711,9 +1425,33 @@ Respond with ONLY valid JSON:
             'insights': insights,
             'generatedAt': now.isoformat(),
             'stillValidAt': now.isoformat(),
-            'isNew': True
+            'isNew': is_new
         }
 
+    def _insights_by_hash_ref(self, teacher_id: str, input_hash: str):
+        """teachers/{teacherId}/pulseInsightsByHash/{hash}: insights for one exact prompt input, any day."""
+        return self._db.document(f'teachers/{teacher_id}/pulseInsightsByHash/{input_hash}')
+
+    def _find_cached_insights(self, teacher_id: str, insights_ref, input_hash: str) -> Optional[List[Dict]]:
+        """
+        Return insights previously generated from identical input: today's or
+        yesterday's doc, or the hash-keyed doc for an older day. One get_all.
+        """
+        yesterday = (datetime.now(timezone.utc) - timedelta(days=1)).strftime('%Y-%m-%d')
+        yesterday_ref = self._db.document(f'teachers/{teacher_id}/dailyInsights/{yesterday}')
+        by_hash_ref = self._insights_by_hash_ref(teacher_id, input_hash)
+        try:
+            for doc in self._db.get_all([insights_ref, yesterday_ref, by_hash_ref]):
+                if doc.exists:
+                    data = doc.to_dict()
+                    # Hash-keyed docs match by id; daily docs by their stored inputHash
+                    matches = doc.id == input_hash or data.get('inputHash') == input_hash
+                    if matches and data.get('insights'):
+                        return data['insights']
+        except Exception as e:
+            print(f"[ClassPulse] Error reading cached insights: {e}", flush=True)
+        return None
+
     def get_class_pulse(self, teacher_id: str) -> Dict[str, Any]:
         """
         Get existing Class Pulse insights without regenerating.
@@ -721,120 +1459,190 @@ Respond with ONLY valid JSON:
         Returns the most recent insights if available, or empty response.
         """
         today = datetime.now(timezone.utc).strftime('%Y-%m-%d')
+
+        with self._pulse_cache_lock:
+            cached = self._pulse_cache.get(teacher_id)
+        if cached and cached[1] == today and time.monotonic() - cached[0] < self.PULSE_CACHE_TTL_SECONDS:
+            return cached[2]
+
         insights_ref = self._db.document(f'teachers/{teacher_id}/dailyInsights/{today}')
         doc = insights_ref.get()
 
         if doc.exists:
             data = doc.to_dict()
-            return {
+            result = {
                 'insights': data.get('insights', []),
                 'generatedAt': data.get('generatedAt').isoformat() if data.get('generatedAt') else None,
                 'stillValidAt': data.get('stillValidAt').isoformat() if data.get('stillValidAt') else None,
                 'isNew': False
             }
+            # Only found docs are cached: a miss is usually followed by a
+            # generate call, whose result must not be hidden by a cached miss
+            with self._pulse_cache_lock:
+                # Re-insert so dict order stays write order, oldest first
+                self._pulse_cache.pop(teacher_id, None)
+                self._pulse_cache[teacher_id] = (time.monotonic(), today, result)
+                while len(self._pulse_cache) > self.PULSE_CACHE_MAX_ENTRIES:
+                    del self._pulse_cache[next(iter(self._pulse_cache))]
+            return result
 
         return self._empty_pulse_response("No insights generated yet today")
 
+    def _invalidate_pulse_cache(self, teacher_id: str) -> None:
+        """Drop the cached get_class_pulse response after writing dailyInsights."""
+        with self._pulse_cache_lock:
+            self._pulse_cache.pop(teacher_id, None)
+
     def _should_regenerate_insights(
         self,
         teacher_id: str,
-        insights_ref
+        existing,
+        live_counters: Optional[Dict]
     ) -> tuple:
         """
         Determine if we should call Gemini to regenerate insights.
 
-        Returns (should_regenerate: bool, reason: str)
-        """
-        existing = insights_ref.get()
+        New activity since the last generation is, cheapest first:
+        1. the teacher's liveCounters minus the values saved with the last pulse
+        2. two count() aggregations since the last generatedAt
+        3. the week's analytics diffed against dataSnapshot
 
+        Returns (should_regenerate: bool, reason: str, analytics: Optional[Dict]).
+        analytics is the week/all result when it was computed, so the caller
+        can reuse it instead of aggregating again.
+        """
         if not existing.exists:
-            return True, "No existing insights for today"
+            return True, "No existing insights for today", None
 
         data = existing.to_dict()
         snapshot = data.get('dataSnapshot', {})
-        last_sessions = snapshot.get('totalSessions', 0)
-        last_struggles = snapshot.get('totalStruggles', 0)
+        analytics = None
+        new_counts = None
+        if live_counters is not None and 'liveSessionCount' in snapshot:
+            new_counts = (
+                live_counters.get('sessionCount', 0) - snapshot['liveSessionCount'],
+                live_counters.get('struggleCount', 0) - snapshot.get('liveStruggleCount', 0)
+            )
+        if new_counts is None:
+            new_counts = self._count_activity_since(teacher_id, data.get('generatedAt'))
+        if new_counts is not None:
+            new_sessions, new_struggles = new_counts
+        else:
+            last_sessions = snapshot.get('totalSessions', 0)
+            last_struggles = snapshot.get('totalStruggles', 0)
 
-        # Get current stats
-        analytics = self.get_teacher_analytics(teacher_id, period="week", level="all")
-        current_sessions = analytics['totals']['sessionCount']
-        current_struggles = sum(
-            len(level.get('topStruggles', []))
-            for level in analytics['byLevel'].values()
-        )
+            # Get current stats
+            analytics = self.get_teacher_analytics(teacher_id, period="week", level="all")
+            current_sessions = analytics['totals']['sessionCount']
+            current_struggles = analytics['totals']['struggleCount']
 
-        new_sessions = current_sessions - last_sessions
-        new_struggles = current_struggles - last_struggles
+            new_sessions = current_sessions - last_sessions
+            new_struggles = current_struggles - last_struggles
 
         if new_sessions >= self.MIN_NEW_SESSIONS_FOR_REGEN:
-            return True, f"{new_sessions} new sessions since last generation"
+            return True, f"{new_sessions} new sessions since last generation", analytics
 
         if new_struggles >= self.MIN_NEW_STRUGGLES_FOR_REGEN:
-            return True, f"{new_struggles} new struggles since last generation"
+            return True, f"{new_struggles} new struggles since last generation", analytics
+
+        return False, f"Only {new_sessions} new sessions and {new_struggles} new struggles (thresholds: {self.MIN_NEW_SESSIONS_FOR_REGEN}/{self.MIN_NEW_STRUGGLES_FOR_REGEN})", analytics
+
+    def _live_counters_ref(self, teacher_id: str):
+        """teachers/{teacherId}/meta/liveCounters: running session/struggle totals kept by the client."""
+        return self._db.document(f'teachers/{teacher_id}/meta/liveCounters')
 
-        return False, f"Only {new_sessions} new sessions and {new_struggles} new struggles (thresholds: {self.MIN_NEW_SESSIONS_FOR_REGEN}/{self.MIN_NEW_STRUGGLES_FOR_REGEN})"
+    def _count_activity_since(self, teacher_id: str, since: Optional[datetime]) -> Optional[tuple]:
+        """
+        (completed sessions, review items) created for this teacher since
+        `since`, via server-side count() on the denormalized teacherId.
+        Completed sessions are counted by their summaries, which carry
+        teacherId from creation; root sessions only get it best effort. None
+        if unknown, including when `since` predates TEACHER_ID_TAGGED_SINCE
+        and untagged docs would be missed.
+        """
+        if since is None or not self._teacher_tagged(since):
+            return None
+        sessions_query = (
+            self._db.collection_group('sessionSummaries')
+            .where('teacherId', '==', teacher_id)
+            .where('createdAt', '>=', since)
+        )
+        review_items_query = (
+            self._db.collection_group('reviewItems')
+            .where('teacherId', '==', teacher_id)
+            .where('createdAt', '>=', since)
+        )
+        try:
+            sessions_future = _top_level_executor.submit(
+                self._run_aggregation, sessions_query.count(alias='count')
+            )
+            struggle_count = self._run_aggregation(review_items_query.count(alias='count')).get('count') or 0
+            session_count = sessions_future.result().get('count') or 0
+        except Exception as e:
+            print(f"[ClassPulse] Error counting new activity for teacher {teacher_id}: {e}", flush=True)
+            return None
+        return int(session_count), int(struggle_count)
 
     def _format_class_data_for_gemini(
         self,
         teacher_id: str,
-        analytics: Dict
+        analytics: Dict,
+        students_per_level: int = 8
     ) -> str:
         """Format analytics data into a readable prompt for Gemini."""
-        lines = ["CLASS OVERVIEW (Last 7 days)", ""]
+        buf = io.StringIO()
+        w = buf.write
+        status_labels = self._PROMPT_STATUS_LABELS
+        perf_thresholds = self._PROMPT_PERF_THRESHOLDS
+        perf_tiers = self._PROMPT_PERF_TIERS
+        w("CLASS OVERVIEW (Last 7 days)\n\n")
 
         for level, data in sorted(analytics['byLevel'].items()):
             student_count = data.get('studentCount', 0)
             if student_count == 0:
                 continue
 
-            lines.append(f"--- {level} Students ({student_count}) ---")
+            w(f"--- {level} Students ({student_count}) ---\n")
 
             # Students with details
-            students = data.get('students', [])
-            for s in students[:8]:
+            for s in data.get('students', [])[:students_per_level]:
                 name = s.get('displayName', 'Unknown')
                 status = s.get('activityStatus', 'unknown')
                 avg_stars = s.get('avgStars')
-
-                status_label = {
-                    'active': 'practicing regularly',
-                    'warning': 'hasn\'t practiced in a few days',
-                    'inactive': 'inactive 7+ days'
-                }.get(status, status)
+                status_label = status_labels.get(status, status)
 
                 if avg_stars:
-                    perf = 'struggling' if avg_stars < 3 else ('solid' if avg_stars < 4 else 'excellent')
-                    lines.append(f"  • {name}: {perf} performance ({avg_stars:.1f}/5 stars), {status_label}")
+                    perf = perf_tiers[bisect_right(perf_thresholds, avg_stars)]
+                    w(f"  • {name}: {perf} performance ({avg_stars:.1f}/5 stars), {status_label}\n")
                 else:
-                    lines.append(f"  • {name}: {status_label}")
+                    w(f"  • {name}: {status_label}\n")
 
             # Common mistakes at this level
             struggles = data.get('topStruggles', [])
             if struggles:
-                lines.append(f"  Common mistakes:")
+                w("  Common mistakes:\n")
                 for s in struggles[:3]:
-                    lines.append(f"    - \"{s['text']}\" ({s['type']}, {s['count']}x)")
+                    w(f"    - \"{s['text']}\" ({s['type']}, {s['count']}x)\n")
 
             # Lessons practiced
             lessons = data.get('lessons', [])
             if lessons:
-                lines.append(f"  Lessons practiced:")
+                w("  Lessons practiced:\n")
                 for lesson in lessons[:3]:
-                    lines.append(
-                        f"    - \"{lesson['title']}\": avg {lesson['avgStars']:.1f}/5 stars across {lesson['completions']} practices"
-                    )
+                    w(f"    - \"{lesson['title']}\": avg {lesson['avgStars']:.1f}/5 stars across {lesson['completions']} practices\n")
 
-            lines.append("")
+            w("\n")
 
         # Cross-level patterns
         cross = analytics.get('crossLevelInsights', {})
         universal = cross.get('universalStruggles', [])
         if universal:
-            lines.append("PATTERNS ACROSS LEVELS:")
+            w("PATTERNS ACROSS LEVELS:\n")
             for u in universal[:3]:
-                lines.append(f"  • \"{u['text']}\" causing trouble for {', '.join(u['affectedLevels'])} students")
+                w(f"  • \"{u['text']}\" causing trouble for {', '.join(u['affectedLevels'])} students\n")
 
-        return "\n".join(lines)
+        # Every line above ends in a newline; the prompt has no trailing one
+        return buf.getvalue()[:-1]
 
     def _call_gemini_for_insights(self, class_data: str) -> List[Dict]:
         """Call Gemini 2.5 Pro to generate insights from class data."""
@@ -845,32 +1653,47 @@ Respond with ONLY valid JSON:
             print("[ClassPulse] Gemini client not available, using fallback", flush=True)
             return self._fallback_insights()
 
-        prompt = self.CLASS_PULSE_PROMPT.format(class_data=class_data)
+        prompt = self._PULSE_PROMPT_HEAD + class_data + self._PULSE_PROMPT_TAIL
 
         try:
             print(f"[ClassPulse] Calling Gemini 3 Flash...", flush=True)
             from google.genai import types
+            # Structured output: the model returns bare JSON in this shape,
+            # so no markdown-fence cleanup is needed before parsing
+            insights_schema = types.Schema(
+                type=types.Type.OBJECT,
+                properties={
+                    'insights': types.Schema(
+                        type=types.Type.ARRAY,
+                        max_items=3,
+                        items=types.Schema(
+                            type=types.Type.OBJECT,
+                            properties={
+                                'type': types.Schema(type=types.Type.STRING, enum=['warning', 'info', 'success']),
+                                'level': types.Schema(type=types.Type.STRING, nullable=True),
+                                'title': types.Schema(type=types.Type.STRING),
+                                'message': types.Schema(type=types.Type.STRING),
+                            },
+                            required=['type', 'title', 'message'],
+                        ),
+                    ),
+                },
+                required=['insights'],
+            )
             response = self._gemini.models.generate_content(
                 model='gemini-3-flash-preview',
                 contents=prompt,
                 config=types.GenerateContentConfig(
                     thinking_config=types.ThinkingConfig(
                         thinking_level=types.ThinkingLevel.LOW
-                    )
+                    ),
+                    response_mime_type='application/json',
+                    response_schema=insights_schema,
                 ),
             )
             print(f"[ClassPulse] Gemini response received", flush=True)
 
-            # Parse JSON response
-            response_text = response.text.strip()
-            # Remove markdown code blocks if present
-            if response_text.startswith('```'):
-                response_text = response_text.split('```')[1]
-                if response_text.startswith('json'):
-                    response_text = response_text[4:]
-                response_text = response_text.strip()
-
-            result = json.loads(response_text)
+            result = json.loads(response.text)
             insights = result.get('insights', [])
 
             # Validate and clean insights
@@ -935,6 +1758,9 @@ CLASS DATA:
 {class_data}
 
 Respond with just your answer - no JSON, no formatting, just plain text."""
+    _QUESTION_PROMPT_HEAD, _QUESTION_PROMPT_MID, _QUESTION_PROMPT_TAIL = (
+        QUESTION_ANSWER_PROMPT.format(question='\x00', class_data='\x00').split('\x00')
+    )
 
     def answer_class_question(
         self,
@@ -981,9 +1807,10 @@ Respond with just your answer - no JSON, no formatting, just plain text."""
         if self._gemini is None:
             return "I can't answer questions right now - the AI service is unavailable. Please try again later."
 
-        prompt = self.QUESTION_ANSWER_PROMPT.format(
-            question=question,
-            class_data=class_data
+        prompt = (
+            self._QUESTION_PROMPT_HEAD + question
+            + self._QUESTION_PROMPT_MID + class_data
+            + self._QUESTION_PROMPT_TAIL
         )
 
         try:
@@ -1028,11 +1855,18 @@ Respond with just your answer - no JSON, no formatting, just plain text."""
         """
         print(f"[Mistakes] Getting mistakes for teacher {teacher_id}, period={period}", flush=True)
 
-        start_time, end_time = self._get_time_range(period)
+        # Every period ends "now", so the reviewItems queries only need the
+        # lower bound: an upper bound of now excludes nothing
+        start_time, _ = self._get_time_range(period)
 
         # Get students for this teacher
-        # Students have a teacherId field linking them to their teacher
-        students_query = self._db.collection('users').where('teacherId', '==', teacher_id)
+        # Students have a teacherId field linking them to their teacher;
+        # only displayName is used, so project the rest of the profile away
+        students_query = (
+            self._db.collection('users')
+            .where('teacherId', '==', teacher_id)
+            .select(['displayName'])
+        )
         students = {}
         for doc in students_query.stream():
             students[doc.id] = doc.to_dict()
@@ -1043,67 +1877,118 @@ Respond with just your answer - no JSON, no formatting, just plain text."""
 
         print(f"[Mistakes] Found {len(students)} students for teacher {teacher_id}", flush=True)
 
-        # Query reviewItems for each student
-        mistakes = []
+        # Windows covered by TEACHER_ID_TAGGED_SINCE: one collection-group query
+        # on the denormalized teacherId covers the class. Older windows may hold
+        # items without teacherId, so every student gets the per-student query.
+        if self._teacher_tagged(start_time):
+            results = self._query_class_mistakes(teacher_id, students, start_time)
+        else:
+            results = {}
+
+        # Students with no match (or every student, above) use per-student
+        # queries on the shared pool
+        missing_student_ids = [sid for sid in students if sid not in results]
+        results.update(self._parallel_per_user(
+            missing_student_ids,
+            lambda student_id: self._fetch_student_mistakes(
+                student_id, students[student_id], start_time
+            )
+        ))
+
         summary = {
             'Grammar': 0,
             'Pronunciation': 0,
             'Vocabulary': 0,
             'Cultural': 0
         }
+        for student_mistakes in results.values():
+            for mistake in student_mistakes:
+                # Count by error type
+                if mistake['errorType'] in summary:
+                    summary[mistake['errorType']] += 1
+
+        # Every per-student list is already newest-first (order_by createdAt DESC),
+        # so a k-way merge yields the global order without a full re-sort
+        mistakes = list(heapq.merge(
+            *results.values(),
+            key=lambda x: x['createdAt'] or '',
+            reverse=True
+        ))
 
-        for student_id, student_data in students.items():
-            try:
-                query = (
-                    self._db.collection('users').document(student_id)
-                    .collection('reviewItems')
-                    .where('createdAt', '>=', start_time)
-                    .where('createdAt', '<=', end_time)
-                    .order_by('createdAt', direction=firestore.Query.DESCENDING)
-                )
+        print(f"[Mistakes] Found {len(mistakes)} total mistakes", flush=True)
 
-                for doc in query.stream():
-                    item = doc.to_dict()
-                    error_type = item.get('errorType', 'Vocabulary')
-
-                    # Count by error type
-                    if error_type in summary:
-                        summary[error_type] += 1
-
-                    # Build mistake object
-                    created_at = item.get('createdAt')
-                    if hasattr(created_at, 'isoformat'):
-                        created_at_str = created_at.isoformat()
-                    elif hasattr(created_at, 'timestamp'):
-                        created_at_str = datetime.fromtimestamp(
-                            created_at.timestamp(), tz=timezone.utc
-                        ).isoformat()
-                    else:
-                        created_at_str = str(created_at) if created_at else None
-
-                    mistakes.append({
-                        'id': doc.id,
-                        'studentId': student_id,
-                        'studentName': student_data.get('displayName', 'Student'),
-                        'errorType': error_type,
-                        'userSentence': item.get('userSentence', ''),
-                        'correction': item.get('correction', ''),
-                        'explanation': item.get('explanation', ''),
-                        'audioUrl': item.get('audioUrl'),
-                        'createdAt': created_at_str
-                    })
+        return {
+            'mistakes': mistakes,
+            'summary': summary
+        }
 
-            except Exception as e:
-                print(f"[Mistakes] Error querying reviewItems for {student_id}: {e}", flush=True)
+    def _query_class_mistakes(
+        self,
+        teacher_id: str,
+        students: Dict[str, Dict],
+        start_time: datetime
+    ) -> Dict[str, List[Dict]]:
+        """
+        Mistakes for the whole class created since start_time, from one
+        collection_group('reviewItems') query. Returns {student_id: [mistake, ...]} for students with at least
+        one match, or {} if the query fails.
+        """
+        results = defaultdict(list)
+        try:
+            query = (
+                self._db.collection_group('reviewItems')
+                .where('teacherId', '==', teacher_id)
+                .where('createdAt', '>=', start_time)
+                .order_by('createdAt', direction=firestore.Query.DESCENDING)
+            )
+            for doc in query.stream():
+                student_id = doc.reference.parent.parent.id
+                if student_id in students:
+                    results[student_id].append(
+                        self._mistake_from_doc(doc, student_id, students[student_id])
+                    )
+        except Exception as e:
+            print(f"[Mistakes] Error querying class reviewItems for teacher {teacher_id}: {e}", flush=True)
+            return {}
+        return dict(results)
+
+    def _fetch_student_mistakes(
+        self,
+        student_id: str,
+        student_data: Dict,
+        start_time: datetime
+    ) -> List[Dict]:
+        """Stream one student's reviewItems since start_time as mistake dicts ([] on error)."""
+        mistakes = []
+        try:
+            query = (
+                self._db.collection('users').document(student_id)
+                .collection('reviewItems')
+                .where('createdAt', '>=', start_time)
+                .order_by('createdAt', direction=firestore.Query.DESCENDING)
+            )
 
-        # Sort by createdAt descending (most recent first)
-        mistakes.sort(key=lambda x: x.get('createdAt') or '', reverse=True)
+            for doc in query.stream():
+                mistakes.append(self._mistake_from_doc(doc, student_id, student_data))
 
-        print(f"[Mistakes] Found {len(mistakes)} total mistakes", flush=True)
+        except Exception as e:
+            print(f"[Mistakes] Error querying reviewItems for {student_id}: {e}", flush=True)
+            return []
+        return mistakes
 
+    def _mistake_from_doc(self, doc, student_id: str, student_data: Dict) -> Dict[str, Any]:
+        """Build the mistake object returned to the Insights tab from a reviewItems doc."""
+        item = doc.to_dict()
         return {
-            'mistakes': mistakes,
-            'summary': summary
+            'id': doc.id,
+            'studentId': student_id,
+            'studentName': student_data.get('displayName', 'Student'),
+            'errorType': item.get('errorType', 'Vocabulary'),
+            'userSentence': item.get('userSentence', ''),
+            'correction': item.get('correction', ''),
+            'explanation': item.get('explanation', ''),
+            'audioUrl': item.get('audioUrl'),
+            'createdAt': _iso(item.get('createdAt'))
         }
 
     def _empty_mistakes_response(self) -> Dict[str, Any]:
@@ -1120,10 +2005,15 @@ Respond with just your answer - no JSON, no formatting, just plain text."""
 
 
 _analytics_service: Optional[AnalyticsService] = None
+_analytics_service_lock = threading.Lock()
 
 
 def get_analytics_service() -> AnalyticsService:
+    # Lazy (it opens Firestore/Gemini clients); the lock keeps two concurrent
+    # first calls from each building a client pool
     global _analytics_service
     if _analytics_service is None:
-        _analytics_service = AnalyticsService()
+        with _analytics_service_lock:
+            if _analytics_service is None:
+                _analytics_service = AnalyticsService()
     return _analytics_service
@@ -4,7 +4,8 @@ Loads environment variables and provides typed config access.
 """
 
 import os
-from typing import List
+from datetime import date
+from typing import FrozenSet, Optional
 from dotenv import load_dotenv
 
 # Load .env file if present (for local development)
@@ -23,10 +24,16 @@ class Config:
 
     # Server
     PORT: int = int(os.getenv("PORT", "8080"))
-    ALLOWED_ORIGINS: List[str] = os.getenv(
-        "ALLOWED_ORIGINS",
-        "http://localhost:5173,http://localhost:3000"
-    ).split(",")
+    # Frozen set, whitespace stripped once: CORS checks each request's Origin
+    # with `in`, and the shared import-time value cannot be mutated
+    ALLOWED_ORIGINS: FrozenSet[str] = frozenset(
+        origin.strip()
+        for origin in os.getenv(
+            "ALLOWED_ORIGINS",
+            "http://localhost:5173,http://localhost:3000"
+        ).split(",")
+        if origin.strip()
+    )
 
     # Gemini Model - Native Audio for voice conversations
     # Updated to December 2025 version which has improved function calling
@@ -35,6 +42,25 @@ class Config:
         "gemini-2.5-flash-native-audio-preview-12-2025"
     )
 
+    # First UTC day for which users/{uid}/tokenTotalsDaily rollups are complete
+    # (YYYY-MM-DD). Unset = cost analytics always scan raw session docs.
+    DAILY_TOKEN_TOTALS_SINCE: Optional[date] = (
+        date.fromisoformat(os.getenv("DAILY_TOKEN_TOTALS_SINCE"))
+        if os.getenv("DAILY_TOKEN_TOTALS_SINCE") else None
+    )
+
+    # First UTC day from which every users/*/sessions, sessionSummaries and
+    # reviewItems doc carries the denormalized teacherId (YYYY-MM-DD). Once
+    # scripts/backfill_level_fields.py has run, set it to a day before the
+    # oldest data. Unset = analytics windows that start before it also read
+    # untagged docs through the per-student paths. Root sessions are not
+    # covered: they are tagged only when the summary is saved, best effort,
+    # so analytics always selects them by missionId.
+    TEACHER_ID_TAGGED_SINCE: Optional[date] = (
+        date.fromisoformat(os.getenv("TEACHER_ID_TAGGED_SINCE"))
+        if os.getenv("TEACHER_ID_TAGGED_SINCE") else None
+    )
+
     @classmethod
     def validate(cls) -> bool:
         """Validate required configuration is present."""
@@ -48,7 +74,7 @@ class Config:
         """Print current configuration (excluding secrets)."""
         print(f"Gemini API Key: {'*' * 8 + cls.GEMINI_API_KEY[-4:] if cls.GEMINI_API_KEY else '(not set)'}")
         print(f"Port: {cls.PORT}")
-        print(f"Allowed Origins: {cls.ALLOWED_ORIGINS}")
+        print(f"Allowed Origins: {sorted(cls.ALLOWED_ORIGINS)}")
         print(f"Gemini Model: {cls.GEMINI_MODEL}")
 
 
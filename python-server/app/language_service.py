@@ -7,32 +7,277 @@ Provides:
 """
 
 import base64
-from typing import Optional
+import hashlib
+import itertools
+import queue
+import re
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future, InvalidStateError, ThreadPoolExecutor
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Callable, Dict, List, Optional, Tuple
 from google.cloud import translate_v2 as translate
 from google.cloud import texttospeech
 
 
+_SENTENCE_BREAK = re.compile(r'(?<=[.!?])(\s+)')
+
+
+def _split_long_text(text: str, limit: int) -> List[Tuple[str, str]]:
+    """
+    Split text on sentence boundaries into pieces of at most `limit` code points.
+
+    Returns (piece, separator) pairs, where separator is the original
+    whitespace that followed the piece (newlines and paragraph breaks
+    included, "" for a hard cut), so "".join(p + s for p, s in pairs) == text.
+    """
+    parts = _SENTENCE_BREAK.split(text)
+    # (sentence or part of one, whitespace that followed it)
+    units = []
+    for i in range(0, len(parts), 2):
+        sentence = parts[i]
+        separator = parts[i + 1] if i + 1 < len(parts) else ""
+        # A single sentence over the limit is cut at its last space before the limit
+        while len(sentence) > limit:
+            cut = sentence.rfind(' ', 0, limit + 1)
+            if cut <= 0:
+                units.append((sentence[:limit], ""))
+                sentence = sentence[limit:]
+            else:
+                rest = sentence[cut:].lstrip(' ')
+                units.append((sentence[:cut], sentence[cut:len(sentence) - len(rest)]))
+                sentence = rest
+        if sentence:
+            units.append((sentence, separator))
+        elif units:
+            units[-1] = (units[-1][0], units[-1][1] + separator)
+
+    pieces = []
+    current, current_separator = None, ""
+    for unit, separator in units:
+        if current is not None and len(current) + len(current_separator) + len(unit) <= limit:
+            current += current_separator + unit
+        else:
+            if current is not None:
+                pieces.append((current, current_separator))
+            current = unit
+        current_separator = separator
+    if current is not None:
+        pieces.append((current, current_separator))
+    return pieces
+
+
+class _TranslationBatcher:
+    """
+    Coalesces concurrent translate calls into multi-segment API requests.
+
+    Requests arriving within WINDOW_SECONDS of each other are grouped by
+    (target, source) - Cloud Translation needs one target per call - and sent
+    as a single list of up to MAX_SEGMENTS strings / MAX_CODE_POINTS characters.
+    Up to MAX_CONCURRENT_CALLS of those requests are in flight at once.
+
+    A batch mixes unrelated requests, so when a multi-segment call fails each
+    segment is retried on its own and only the failing ones get the error.
+    """
+
+    WINDOW_SECONDS = 0.02
+    MAX_SEGMENTS = 128
+    MAX_CODE_POINTS = 4500
+    MAX_CONCURRENT_CALLS = 4
+    # Upper bound for callers waiting on a submitted segment
+    RESULT_TIMEOUT_SECONDS = 30
+
+    def __init__(self, get_client: Callable[[], translate.Client]):
+        self._get_client = get_client
+        self._queue: queue.Queue = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._worker_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=self.MAX_CONCURRENT_CALLS, thread_name_prefix="translate")
+
+    def submit(self, text: str, target: str, source: Optional[str]) -> Future:
+        """Queue one segment; the future resolves to the API's result dict for it."""
+        future: Future = Future()
+        self._queue.put((text, target, source, future))
+        worker = self._worker
+        if worker is None or not worker.is_alive():
+            with self._worker_lock:
+                if self._worker is None or not self._worker.is_alive():
+                    self._worker = threading.Thread(target=self._run, name="translate-batcher", daemon=True)
+                    self._worker.start()
+        return future
+
+    def _run(self) -> None:
+        while True:
+            pending = [self._queue.get()]
+            # An error here must not kill the worker: fail this window's
+            # segments and keep serving the queue
+            try:
+                self._collect(pending)
+                groups = defaultdict(list)
+                for item in pending:
+                    groups[(item[1], item[2])].append(item)
+                for (target, source), items in groups.items():
+                    for chunk in self._split(items):
+                        self._executor.submit(self._translate, chunk, target, source)
+            except Exception as e:
+                print(f"[LanguageService] Translation batcher error: {e}", flush=True)
+                for item in pending:
+                    self._settle(item[3], error=e)
+
+    def _collect(self, pending: List[tuple]) -> None:
+        """Add segments arriving within WINDOW_SECONDS to pending, up to the batch limits."""
+        code_points = len(pending[0][0])
+        deadline = time.monotonic() + self.WINDOW_SECONDS
+        while len(pending) < self.MAX_SEGMENTS and code_points < self.MAX_CODE_POINTS:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            pending.append(item)
+            code_points += len(item[0])
+
+    def _split(self, items: List[tuple]) -> List[List[tuple]]:
+        """Split a group into calls under MAX_CODE_POINTS (an oversized text goes alone)."""
+        chunks, chunk, size = [], [], 0
+        for item in items:
+            if chunk and size + len(item[0]) > self.MAX_CODE_POINTS:
+                chunks.append(chunk)
+                chunk, size = [], 0
+            chunk.append(item)
+            size += len(item[0])
+        chunks.append(chunk)
+        return chunks
+
+    def _translate(self, items: List[tuple], target: str, source: Optional[str]) -> None:
+        try:
+            results = self._get_client().translate(
+                [item[0] for item in items],
+                target_language=target,
+                source_language=source
+            )
+        except Exception as e:
+            if len(items) == 1:
+                self._settle(items[0][3], error=e)
+                return
+            # One bad segment must not fail everyone else's request
+            print(f"[LanguageService] Batch of {len(items)} failed ({e}), retrying segments one by one", flush=True)
+            for item in items:
+                self._translate([item], target, source)
+            return
+        for item, result in zip(items, results):
+            self._settle(item[3], result=result)
+
+    @staticmethod
+    def _settle(future: Future, result=None, error: Optional[BaseException] = None) -> None:
+        """Resolve a future unless it already was (e.g. failed by _run's error path)."""
+        try:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+        except InvalidStateError:
+            pass
+
+
+@lru_cache(maxsize=128)
+def _voice_params(language_code: str, voice_name: Optional[str]) -> texttospeech.VoiceSelectionParams:
+    """Voice selection for a language/voice pair, built once and shared read-only."""
+    return texttospeech.VoiceSelectionParams(
+        language_code=language_code,
+        name=voice_name,
+        ssml_gender=texttospeech.SsmlVoiceGender.FEMALE if voice_name is None else None
+    )
+
+
+@lru_cache(maxsize=128)
+def _audio_config(audio_encoding: str, speaking_rate: float, pitch: float) -> texttospeech.AudioConfig:
+    """Audio config for an encoding/rate/pitch combination, built once and shared read-only."""
+    return texttospeech.AudioConfig(
+        audio_encoding=getattr(texttospeech.AudioEncoding, audio_encoding),
+        speaking_rate=speaking_rate,
+        pitch=pitch
+    )
+
+
 class LanguageService:
     """Service for translation and text-to-speech operations."""
 
+    # In-process translation cache (short tutor/student phrases repeat across users)
+    TRANSLATION_CACHE_TTL_SECONDS = 3600
+    TRANSLATION_CACHE_MAX_ENTRIES = 10000
+
+    # Supported TTS output encodings -> MIME type. MP3 (32 kbps) plays everywhere;
+    # OGG_OPUS is opt-in since older Safari cannot play it
+    AUDIO_CONTENT_TYPES = {
+        "MP3": "audio/mpeg",
+        "OGG_OPUS": "audio/ogg",
+    }
+
+    # TTS clients (one gRPC channel each) shared round-robin across request threads
+    TTS_CLIENT_POOL_SIZE = 4
+
+    # In-process cache of synthesized base64 audio for hot phrases like
+    # "Great job!": only short texts are cached, and the total base64 size is
+    # capped (a 200-char phrase is roughly 80 KB at 32 kbps)
+    TTS_CACHE_MAX_TEXT_CHARS = 200
+    TTS_CACHE_MAX_BYTES = 32 * 1024 * 1024
+
     def __init__(self):
         """Initialize language service clients."""
         self._translate_client: Optional[translate.Client] = None
-        self._tts_client: Optional[texttospeech.TextToSpeechClient] = None
+        self._translate_client_lock = threading.Lock()
+        self._tts_clients: List[texttospeech.TextToSpeechClient] = []
+        self._tts_clients_lock = threading.Lock()
+        self._tts_thread_local = threading.local()
+        self._tts_round_robin = itertools.count()
+        # (sha1(text), target_code, source_language) -> (cached_at_monotonic, result)
+        self._translation_cache: Dict[tuple, tuple] = {}
+        self._translation_cache_lock = threading.Lock()
+        self._translation_batcher = _TranslationBatcher(lambda: self.translate_client)
+        # sha1(voice settings + text) -> base64 audio, least recently used first
+        self._tts_cache: Dict[bytes, str] = {}
+        self._tts_cache_bytes = 0
+        self._tts_cache_lock = threading.Lock()
 
     @property
     def translate_client(self) -> translate.Client:
-        """Lazy initialization of translation client."""
+        """
+        Lazy initialization of translation client.
+
+        The batcher's dispatch threads ask for it concurrently, so creation is
+        locked and only one client is ever built.
+        """
         if self._translate_client is None:
-            self._translate_client = translate.Client()
+            with self._translate_client_lock:
+                if self._translate_client is None:
+                    self._translate_client = translate.Client()
         return self._translate_client
 
     @property
     def tts_client(self) -> texttospeech.TextToSpeechClient:
-        """Lazy initialization of TTS client."""
-        if self._tts_client is None:
-            self._tts_client = texttospeech.TextToSpeechClient()
-        return self._tts_client
+        """
+        TTS client for the calling thread, assigned round-robin on first use.
+
+        The pool is created lazily; concurrent syntheses spread over several
+        warm channels instead of queueing behind one.
+        """
+        client = getattr(self._tts_thread_local, 'client', None)
+        if client is None:
+            if not self._tts_clients:
+                with self._tts_clients_lock:
+                    if not self._tts_clients:
+                        self._tts_clients = [
+                            texttospeech.TextToSpeechClient()
+                            for _ in range(self.TTS_CLIENT_POOL_SIZE)
+                        ]
+            client = self._tts_clients[next(self._tts_round_robin) % len(self._tts_clients)]
+            self._tts_thread_local.client = client
+        return client
 
     def translate_text(
         self,
@@ -52,26 +297,56 @@ class LanguageService:
             dict with translated text and detected source language
         """
         # Extract language code from BCP-47 format (e.g., 'uk-UA' -> 'uk')
-        target_code = target_language.split('-')[0] if '-' in target_language else target_language
+        target_code = target_language.partition('-')[0]
+
+        # Same source and target language: nothing to translate, skip the API
+        if source_language and source_language.partition('-')[0] == target_code:
+            return {
+                "translatedText": text,
+                "detectedSourceLanguage": source_language,
+                "targetLanguage": target_code
+            }
+
+        cache_key = (hashlib.sha1(text.encode('utf-8')).digest(), target_code, source_language)
+        cached = self._translation_cache.get(cache_key)
+        if cached and time.monotonic() - cached[0] < self.TRANSLATION_CACHE_TTL_SECONDS:
+            return cached[1]
+
+        # Cloud Translation slows down past ~5K code points per request, so long
+        # inputs go out as sentence-aligned pieces that are translated concurrently
+        limit = self._translation_batcher.MAX_CODE_POINTS
+        segments = _split_long_text(text, limit) if len(text) > limit else [(text, "")]
 
         try:
-            result = self.translate_client.translate(
-                text,
-                target_language=target_code,
-                source_language=source_language
-            )
+            # Blocks until the batcher has sent these segments (with any concurrent ones)
+            futures = [self._translation_batcher.submit(piece, target_code, source_language) for piece, _ in segments]
+            deadline = time.monotonic() + self._translation_batcher.RESULT_TIMEOUT_SECONDS
+            results = [future.result(timeout=max(0, deadline - time.monotonic())) for future in futures]
 
-            return {
-                "translatedText": result["translatedText"],
-                "detectedSourceLanguage": result.get("detectedSourceLanguage", source_language),
+            translation = {
+                # Rejoin with the original whitespace between pieces
+                "translatedText": "".join(
+                    result["translatedText"] + separator
+                    for result, (_, separator) in zip(results, segments)
+                ),
+                "detectedSourceLanguage": results[0].get("detectedSourceLanguage", source_language),
                 "targetLanguage": target_code
             }
         except Exception as e:
             print(f"[LanguageService] Translation error: {e}", flush=True)
             raise
 
+        with self._translation_cache_lock:
+            self._translation_cache.pop(cache_key, None)
+            self._translation_cache[cache_key] = (time.monotonic(), translation)
+            # Insertion order is write order, so the front holds the oldest entries
+            while len(self._translation_cache) > self.TRANSLATION_CACHE_MAX_ENTRIES:
+                del self._translation_cache[next(iter(self._translation_cache))]
+        return translation
+
     # Best voices by language - Studio (most realistic) > Neural2 > Standard
-    BEST_VOICES = {
+    # Read-only view: shared by every request thread and the TTS cache key
+    BEST_VOICES = MappingProxyType({
         "en-US": "en-US-Studio-O",   # Studio female - most realistic
         "en-GB": "en-GB-Neural2-F",  # Neural2 female, British English
         "uk-UA": "uk-UA-Standard-A", # Ukrainian (Studio/Neural2 not available)
@@ -83,7 +358,7 @@ class LanguageService:
         "ja-JP": "ja-JP-Neural2-B",  # Neural2 female, Japanese
         "ko-KR": "ko-KR-Neural2-A",  # Neural2 female, Korean
         "zh-CN": "cmn-CN-Neural2-A", # Neural2 female, Mandarin Chinese
-    }
+    })
 
     def text_to_speech(
         self,
@@ -91,7 +366,8 @@ class LanguageService:
         language_code: str = "en-US",
         voice_name: Optional[str] = None,
         speaking_rate: float = 0.9,
-        pitch: float = 0.0
+        pitch: float = 0.0,
+        audio_encoding: str = "MP3"
     ) -> bytes:
         """
         Convert text to speech audio using high-quality Neural2 voices.
@@ -102,27 +378,19 @@ class LanguageService:
             voice_name: Optional specific voice name (uses Neural2 default if not provided)
             speaking_rate: Speed of speech (0.25 to 4.0, default 0.9 for clarity)
             pitch: Voice pitch adjustment (-20.0 to 20.0)
+            audio_encoding: Output encoding, a key of AUDIO_CONTENT_TYPES (default MP3)
 
         Returns:
-            MP3 audio bytes
+            Audio bytes in the requested encoding
         """
         # Use best available voice (Studio > Neural2 > Standard)
         if voice_name is None:
             voice_name = self.BEST_VOICES.get(language_code)
 
-        # Build the voice request
-        voice_params = texttospeech.VoiceSelectionParams(
-            language_code=language_code,
-            name=voice_name,
-            ssml_gender=texttospeech.SsmlVoiceGender.FEMALE if voice_name is None else None
-        )
-
-        # Select audio config - MP3 for web playback
-        audio_config = texttospeech.AudioConfig(
-            audio_encoding=texttospeech.AudioEncoding.MP3,
-            speaking_rate=speaking_rate,
-            pitch=pitch
-        )
+        # Voice and audio config come from a small set of combinations, so the
+        # request messages are cached; MP3 for web playback unless Opus is requested
+        voice_params = _voice_params(language_code, voice_name)
+        audio_config = _audio_config(audio_encoding, speaking_rate, pitch)
 
         # Build synthesis input
         synthesis_input = texttospeech.SynthesisInput(text=text)
@@ -145,7 +413,8 @@ class LanguageService:
         language_code: str = "en-US",
         voice_name: Optional[str] = None,
         speaking_rate: float = 0.9,
-        pitch: float = 0.0
+        pitch: float = 0.0,
+        audio_encoding: str = "MP3"
     ) -> str:
         """
         Convert text to speech and return base64-encoded audio.
@@ -156,27 +425,51 @@ class LanguageService:
             voice_name: Optional specific voice name
             speaking_rate: Speed of speech
             pitch: Voice pitch adjustment
+            audio_encoding: Output encoding, a key of AUDIO_CONTENT_TYPES
 
         Returns:
-            Base64-encoded MP3 audio string
+            Base64-encoded audio string
         """
+        # Resolve the default voice first so explicit and implicit requests share entries
+        if voice_name is None:
+            voice_name = self.BEST_VOICES.get(language_code)
+        cache_key = None
+        if len(text) <= self.TTS_CACHE_MAX_TEXT_CHARS:
+            cache_key = hashlib.sha1(
+                f"{audio_encoding}|{language_code}|{voice_name or ''}|{speaking_rate}|{pitch}|{text}".encode('utf-8')
+            ).digest()
+            with self._tts_cache_lock:
+                cached = self._tts_cache.pop(cache_key, None)
+                if cached is not None:
+                    self._tts_cache[cache_key] = cached
+                    return cached
+
         audio_bytes = self.text_to_speech(
             text=text,
             language_code=language_code,
             voice_name=voice_name,
             speaking_rate=speaking_rate,
-            pitch=pitch
+            pitch=pitch,
+            audio_encoding=audio_encoding
         )
-        return base64.b64encode(audio_bytes).decode('utf-8')
+        audio_base64 = base64.b64encode(audio_bytes).decode('utf-8')
+
+        if cache_key is not None:
+            with self._tts_cache_lock:
+                previous = self._tts_cache.pop(cache_key, None)
+                if previous is not None:
+                    self._tts_cache_bytes -= len(previous)
+                self._tts_cache[cache_key] = audio_base64
+                self._tts_cache_bytes += len(audio_base64)
+                while self._tts_cache_bytes > self.TTS_CACHE_MAX_BYTES:
+                    self._tts_cache_bytes -= len(self._tts_cache.pop(next(iter(self._tts_cache))))
+        return audio_base64
 
 
-# Singleton instance
-_language_service: Optional[LanguageService] = None
+# Singleton instance, created at import (construction is cheap; API clients stay lazy)
+_language_service = LanguageService()
 
 
 def get_language_service() -> LanguageService:
     """Get the singleton LanguageService instance."""
-    global _language_service
-    if _language_service is None:
-        _language_service = LanguageService()
     return _language_service
@@ -5,6 +5,7 @@ Assembles final system prompts by combining teacher content
 with auto-injected tool instructions.
 """
 
+from functools import lru_cache
 from typing import Optional
 
 
@@ -69,38 +70,44 @@ Do not wait - call as soon as the task is clearly completed.
         Returns:
             Complete system prompt with tool instructions injected
         """
+        # Output is deterministic in its inputs, so repeat session starts for the
+        # same lesson reuse the assembled string
+        tasks_key = tuple((task["id"], task["text"]) for task in tasks) if tasks else ()
+        return self._build_cached(teacher_prompt, tasks_key, is_review_lesson)
+
+    @classmethod
+    @lru_cache(maxsize=1024)
+    def _build_cached(cls, teacher_prompt: str, tasks_key: tuple, is_review_lesson: bool) -> str:
+        """Assemble the prompt; tasks_key is ((id, text), ...) so the call is hashable."""
         sections = []
 
         # 1. Teacher's content first (their scenario, role, personality)
         sections.append(teacher_prompt.strip())
 
         # 2. Add task instructions if tasks exist
-        if tasks and len(tasks) > 0:
+        if tasks_key:
             task_lines = "\n".join(
-                f'- task_id="{task["id"]}" → {task["text"]}'
-                for task in tasks
+                f'- task_id="{task_id}" → {task_text}'
+                for task_id, task_text in tasks_key
             )
             sections.append(
-                self.TASK_INSTRUCTIONS_TEMPLATE.format(task_list=task_lines)
+                cls.TASK_INSTRUCTIONS_TEMPLATE.format(task_list=task_lines)
             )
 
         # 3. Add review lesson instructions if applicable
         if is_review_lesson:
-            sections.append(self.REVIEW_INSTRUCTIONS)
+            sections.append(cls.REVIEW_INSTRUCTIONS)
 
         # 4. Always add base tool instructions
-        sections.append(self.BASE_TOOL_INSTRUCTIONS)
+        sections.append(cls.BASE_TOOL_INSTRUCTIONS)
 
         return "\n".join(sections)
 
 
-# Singleton instance
-_prompt_builder: Optional[PromptBuilder] = None
+# Singleton instance, created at import (stateless; the build cache lives on the class)
+_prompt_builder = PromptBuilder()
 
 
 def get_prompt_builder() -> PromptBuilder:
     """Get singleton PromptBuilder instance."""
-    global _prompt_builder
-    if _prompt_builder is None:
-        _prompt_builder = PromptBuilder()
     return _prompt_builder
@@ -2,22 +2,22 @@
 Weekly Review Generator Service
 
 Generates personalized review lessons based on student struggles.
-Uses Gemini 3 Flash to create natural conversational prompts.
-Fetches the meta-prompt template from Firestore so teachers can edit it.
+Fetches the review template from Firestore so teachers can edit it.
 """
 
 import os
+import re
+import threading
+import time
 from datetime import datetime, timedelta, timezone
 from typing import List, Optional
 from dataclasses import dataclass
 
-from google import genai
 from google.cloud import firestore
+from google.oauth2 import service_account
 
-from app.config import config
 
-
-@dataclass
+@dataclass(slots=True)
 class ReviewItem:
     """Review item document from Firestore (new schema)."""
     id: str
@@ -31,9 +31,14 @@ class ReviewItem:
     last_reviewed_at: Optional[datetime]
     audio_url: Optional[str] = None  # Firebase Storage download URL for error audio
 
+    @property
+    def audio_label(self) -> str:
+        """Audio marker used in generated prompts ("HAS AUDIO" triggers play_student_audio)."""
+        return 'HAS AUDIO' if self.audio_url else 'no audio'
+
 
 # Legacy type for backwards compatibility during migration
-@dataclass
+@dataclass(slots=True)
 class StruggleItem:
     """Struggle document from Firestore (legacy)."""
     id: str
@@ -46,7 +51,7 @@ class StruggleItem:
     last_reviewed_at: Optional[datetime]
 
 
-@dataclass
+@dataclass(slots=True)
 class ReviewLesson:
     """Generated review lesson."""
     id: str
@@ -69,6 +74,26 @@ class ReviewService:
     REVIEW_COOLDOWN_DAYS = 7
     MAX_REVIEW_COUNT = 3  # After 3 reviews, mark as mastered
 
+    # The review template is teacher-edited and rarely changes; batch runs read
+    # it once per user, so keep it in memory briefly
+    TEMPLATE_CACHE_TTL_SECONDS = 300
+
+    # Server-side template placeholders; {{studentName}} is left for the frontend
+    _TEMPLATE_PLACEHOLDER = re.compile(r'\{\{(level|struggles|itemReference)\}\}')
+
+    _ITEM_REFERENCE_HEADER = (
+        '## REVIEW ITEM REFERENCE (for function calls)',
+        '',
+        'Use these exact IDs when calling play_student_audio or mark_item_mastered:',
+        ''
+    )
+
+    # reviewItems fields read by get_eligible_review_items
+    REVIEW_ITEM_FIELDS = [
+        'errorType', 'severity', 'userSentence', 'correction', 'explanation',
+        'reviewCount', 'mastered', 'lastReviewedAt', 'audioUrl',
+    ]
+
     # Direct template (NOT a meta-prompt) - placeholders get replaced directly
     # This IS the final system prompt, not instructions to generate one
     DEFAULT_REVIEW_TEMPLATE = """You are a friendly English tutor conducting a WEEKLY REVIEW session with {{studentName}}.
@@ -133,10 +158,7 @@ Adjust your speech accordingly:
 {{itemReference}}"""
 
     def __init__(self):
-        """Initialize with Firestore and Gemini clients."""
-        import os
-        from google.oauth2 import service_account
-
+        """Initialize with the Firestore client."""
         # Use service account credentials if available
         creds_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'firebase-service-account.json')
         if os.path.exists(creds_path):
@@ -146,24 +168,32 @@ Adjust your speech accordingly:
             # Fallback to default credentials
             self._db = firestore.Client(project='ndtutorlive')
 
-        # Configure Gemini client for prompt generation
-        self._client = genai.Client(api_key=config.GEMINI_API_KEY)
+        # (cached_at_monotonic, template) from the last successful read
+        self._template_cache: Optional[tuple] = None
 
     def get_review_template(self) -> str:
         """
         Fetch the review session template from Firestore.
         Falls back to default if not found.
+        Successful reads are reused for TEMPLATE_CACHE_TTL_SECONDS.
         """
+        cached = self._template_cache
+        if cached and time.monotonic() - cached[0] < self.TEMPLATE_CACHE_TTL_SECONDS:
+            return cached[1]
+
         try:
             template_ref = self._db.document('systemTemplates/weeklyReviewTemplate')
             template_doc = template_ref.get()
 
             if template_doc.exists:
                 data = template_doc.to_dict()
-                return data.get('template', self.DEFAULT_REVIEW_TEMPLATE)
+                template = data.get('template', self.DEFAULT_REVIEW_TEMPLATE)
+            else:
+                print('[Review] Template not found in Firestore, using default')
+                template = self.DEFAULT_REVIEW_TEMPLATE
 
-            print('[Review] Template not found in Firestore, using default')
-            return self.DEFAULT_REVIEW_TEMPLATE
+            self._template_cache = (time.monotonic(), template)
+            return template
 
         except Exception as e:
             print(f'[Review] Error fetching template: {e}, using default')
@@ -176,36 +206,58 @@ Adjust your speech accordingly:
         """
         try:
             user_ref = self._db.document(f'users/{user_id}')
-            user_doc = user_ref.get()
-
-            if user_doc.exists:
-                data = user_doc.to_dict()
-                return data.get('level', 'B1')
-
-            return 'B1'
+            return self._level_from_doc(user_ref.get())
 
         except Exception as e:
             print(f'[Review] Error fetching user level: {e}, defaulting to B1')
             return 'B1'
 
-    def get_eligible_review_items(self, user_id: str) -> List[ReviewItem]:
+    def _level_from_doc(self, user_doc) -> str:
+        """Level from a users/{uid} snapshot, B1 if the doc or field is missing."""
+        if user_doc.exists:
+            return user_doc.to_dict().get('level', 'B1')
+        return 'B1'
+
+    def _as_utc(self, value) -> Optional[datetime]:
+        """
+        Firestore timestamps arrive as tz-aware DatetimeWithNanoseconds (a
+        datetime subclass), so they are used as-is; naive datetimes are UTC.
+        Anything else (missing/null) gives None.
+        """
+        if not isinstance(value, datetime):
+            return None
+        return value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)
+
+    def get_eligible_review_items(
+        self, user_id: str, now: Optional[datetime] = None
+    ) -> List[ReviewItem]:
         """
         Get review items eligible for weekly review.
 
         Criteria:
         - mastered = false
         - reviewCount < 3
-        - lastReviewedAt is null OR > 7 days ago
+        - lastReviewedAt is null OR > 7 days ago (relative to `now`, default current UTC time)
         """
         # Use new reviewItems collection
         review_items_ref = self._db.collection(f'users/{user_id}/reviewItems')
 
-        # Query for unmastered review items
-        query = review_items_ref.where('mastered', '==', False)
+        # Unmastered items under the review limit, filtered server-side via the
+        # (mastered, reviewCount) index and projected to the fields used below.
+        # The cooldown stays in Python: never-reviewed items have a null
+        # lastReviewedAt, which a range filter would exclude.
+        query = (
+            review_items_ref
+            .where('mastered', '==', False)
+            .where('reviewCount', '<', self.MAX_REVIEW_COUNT)
+            .select(self.REVIEW_ITEM_FIELDS)
+        )
         docs = query.stream()
 
         eligible = []
-        cutoff_date = datetime.now(timezone.utc) - timedelta(days=self.REVIEW_COOLDOWN_DAYS)
+        if now is None:
+            now = datetime.now(timezone.utc)
+        cutoff_date = now - timedelta(days=self.REVIEW_COOLDOWN_DAYS)
 
         for doc in docs:
             data = doc.to_dict()
@@ -216,29 +268,16 @@ Adjust your speech accordingly:
 
             # Skip if reviewed within last 7 days
             last_reviewed = data.get('lastReviewedAt')
-            if last_reviewed:
-                # Handle Firestore timestamp
-                if hasattr(last_reviewed, 'timestamp'):
-                    last_reviewed_dt = datetime.fromtimestamp(
-                        last_reviewed.timestamp(), tz=timezone.utc
-                    )
-                elif isinstance(last_reviewed, datetime):
-                    last_reviewed_dt = last_reviewed.replace(tzinfo=timezone.utc)
-                else:
-                    last_reviewed_dt = None
-
-                if last_reviewed_dt and last_reviewed_dt > cutoff_date:
-                    continue
-
-            # Ensure severity is numeric (some legacy items might have string values)
-            raw_severity = data.get('severity', 5)
-            if isinstance(raw_severity, str):
-                try:
-                    severity = int(raw_severity)
-                except ValueError:
-                    severity = 5  # Default if can't parse
-            else:
-                severity = int(raw_severity) if raw_severity else 5
+            last_reviewed_dt = self._as_utc(last_reviewed)
+            if last_reviewed_dt and last_reviewed_dt > cutoff_date:
+                continue
+
+            # Ensure severity is numeric (some legacy items might have string values);
+            # missing, zero, empty or unparseable values default to 5
+            try:
+                severity = int(data.get('severity') or 5)
+            except (TypeError, ValueError):
+                severity = 5
 
             eligible.append(ReviewItem(
                 id=doc.id,
@@ -280,18 +319,9 @@ Adjust your speech accordingly:
                 continue
 
             last_reviewed = data.get('lastReviewedAt')
-            if last_reviewed:
-                if hasattr(last_reviewed, 'timestamp'):
-                    last_reviewed_dt = datetime.fromtimestamp(
-                        last_reviewed.timestamp(), tz=timezone.utc
-                    )
-                elif isinstance(last_reviewed, datetime):
-                    last_reviewed_dt = last_reviewed.replace(tzinfo=timezone.utc)
-                else:
-                    last_reviewed_dt = None
-
-                if last_reviewed_dt and last_reviewed_dt > cutoff_date:
-                    continue
+            last_reviewed_dt = self._as_utc(last_reviewed)
+            if last_reviewed_dt and last_reviewed_dt > cutoff_date:
+                continue
 
             eligible.append(StruggleItem(
                 id=doc.id,
@@ -316,49 +346,46 @@ Adjust your speech accordingly:
         """
         template = self.get_review_template()
 
-        # Format review items for the {{struggles}} section
+        # One pass over the items builds both the {{struggles}} section and the
+        # item reference section (for easy ID lookup)
         item_descriptions = []
+        reference_lines = list(self._ITEM_REFERENCE_HEADER)
         for item in items:
-            audio_status = 'HAS AUDIO' if item.audio_url else 'no audio'
-            desc = f'- **{item.correction}** ({audio_status})\n'
-            desc += f'  - ID: `{item.id}`\n'
-            desc += f'  - Student said: "{item.user_sentence}"\n'
-            desc += f'  - Error type: {item.error_type}'
+            desc_lines = [
+                f'- **{item.correction}** ({item.audio_label})',
+                f'  - ID: `{item.id}`',
+                f'  - Student said: "{item.user_sentence}"',
+                f'  - Error type: {item.error_type}',
+            ]
             if item.explanation:
-                desc += f'\n  - Why: {item.explanation}'
-            item_descriptions.append(desc)
+                desc_lines.append(f'  - Why: {item.explanation}')
+            item_descriptions.append('\n'.join(desc_lines))
+            reference_lines.append(self._item_reference_line(item))
 
         struggles_text = '\n'.join(item_descriptions)
+        item_reference = '\n'.join(reference_lines)
 
-        # Build the item reference section for easy ID lookup
-        item_reference = self._build_item_reference_section(items)
-
-        # Replace all placeholders
-        prompt = template.replace('{{level}}', level)
-        prompt = prompt.replace('{{struggles}}', struggles_text)
-        prompt = prompt.replace('{{itemReference}}', item_reference)
+        # Replace all placeholders in one pass over the template. str.format
+        # is not an option: teacher-edited templates contain literal braces
+        # (e.g. the JSON function-call examples).
+        values = {'level': level, 'struggles': struggles_text, 'itemReference': item_reference}
         # Note: {{studentName}} is replaced at runtime by the frontend
 
-        return prompt
+        return self._TEMPLATE_PLACEHOLDER.sub(lambda m: values[m.group(1)], template)
 
     def _build_item_reference_section(self, items: List[ReviewItem]) -> str:
         """
         Build a reference section with explicit item IDs for function calls.
         This ensures the AI has the specific IDs needed for play_student_audio and mark_item_mastered.
         """
-        lines = [
-            '## REVIEW ITEM REFERENCE (for function calls)',
-            '',
-            'Use these exact IDs when calling play_student_audio or mark_item_mastered:',
-            ''
-        ]
-
-        for item in items:
-            audio_status = 'HAS AUDIO' if item.audio_url else 'no audio'
-            lines.append(f'- ID: `{item.id}` | "{item.correction}" | {audio_status}')
-
+        lines = list(self._ITEM_REFERENCE_HEADER)
+        lines.extend(self._item_reference_line(item) for item in items)
         return '\n'.join(lines)
 
+    def _item_reference_line(self, item: ReviewItem) -> str:
+        """One `- ID: ... | "correction" | audio` line of the item reference section."""
+        return f'- ID: `{item.id}` | "{item.correction}" | {item.audio_label}'
+
     def _create_fallback_prompt_from_items(self, items: List[ReviewItem], level: str) -> str:
         """Create a basic fallback prompt from review items if Gemini fails."""
         corrections = ', '.join([f'"{r.correction}"' for r in items[:5]])
@@ -371,62 +398,9 @@ Be warm and encouraging. Help gently if they struggle.
 
 {item_reference}"""
 
-    def generate_review_prompt(self, struggles: List[StruggleItem], level: str) -> str:
-        """
-        @deprecated Use generate_review_prompt_from_items instead.
-        Generate a conversational system prompt incorporating struggle words.
-        Uses Gemini 2.5 Flash for natural language generation.
-        """
-        # Fetch the editable template from Firestore
-        template = self.get_meta_prompt_template()
-
-        # Format struggles list
-        struggle_descriptions = []
-        for s in struggles:
-            desc = f'- "{s.word}" ({s.struggle_type}'
-            if s.context:
-                desc += f' - {s.context}'
-            desc += ')'
-            struggle_descriptions.append(desc)
-
-        struggle_text = '\n'.join(struggle_descriptions)
-
-        # Substitute placeholders
-        prompt = template.replace('{{level}}', level)
-        prompt = prompt.replace('{{struggles}}', struggle_text)
-
-        # Generate the actual conversation prompt using Gemini 3 Flash
-        # Using minimal thinking for low latency and cost
-        try:
-            from google.genai import types
-            response = self._client.models.generate_content(
-                model='gemini-3-flash-preview',
-                contents=prompt,
-                config=types.GenerateContentConfig(
-                    thinking_config=types.ThinkingConfig(
-                        thinking_level=types.ThinkingLevel.MINIMAL
-                    )
-                ),
-            )
-            return response.text.strip()
-
-        except Exception as e:
-            print(f'[Review] Error generating prompt with Gemini: {e}')
-            # Return a fallback prompt
-            return self._create_fallback_prompt(struggles, level)
-
-    def _create_fallback_prompt(self, struggles: List[StruggleItem], level: str) -> str:
-        """Create a basic fallback prompt if Gemini fails."""
-        words = ', '.join([s.word for s in struggles])
-        return f"""You are Sam, a friendly cafe owner helping a customer.
-The student is at {level} level.
-During your natural conversation about their coffee order and day,
-find opportunities to use these words: {words}.
-Be warm and encouraging. Help gently if they struggle."""
-
-    def _get_week_start(self) -> str:
+    def _get_week_start(self, now: Optional[datetime] = None) -> str:
         """Get ISO date string for the start of current week (Monday)."""
-        today = datetime.now(timezone.utc).date()
+        today = (now or datetime.now(timezone.utc)).date()
         # Monday is weekday 0
         monday = today - timedelta(days=today.weekday())
         return monday.isoformat()
@@ -438,32 +412,36 @@ Be warm and encouraging. Help gently if they struggle."""
         Returns None if user has insufficient review items or review already exists.
         Uses new reviewItems collection.
         """
+        # One timestamp for the week key, the cooldown cutoff and the writes
+        now = datetime.now(timezone.utc)
+
         # Check for existing review this week
-        week_start = self._get_week_start()
+        week_start = self._get_week_start(now=now)
         review_id = f'week-{week_start}'
 
+        # This week's lesson and the user's doc (for level) in one round trip
         existing_ref = self._db.document(f'users/{user_id}/reviewLessons/{review_id}')
-        existing = existing_ref.get()
+        user_ref = self._db.document(f'users/{user_id}')
+        docs = {doc.reference.path: doc for doc in self._db.get_all([existing_ref, user_ref])}
+        existing, user_doc = docs[existing_ref.path], docs[user_ref.path]
         if existing.exists:
             print(f'[Review] Review already exists for user {user_id} week {week_start}')
             return None
 
         # Get eligible review items (new collection)
-        review_items = self.get_eligible_review_items(user_id)
+        review_items = self.get_eligible_review_items(user_id, now=now)
 
         if len(review_items) < self.MIN_STRUGGLES:
             print(f'[Review] Insufficient review items ({len(review_items)}) for user {user_id}')
             return None
 
         # Get user's level
-        level = self.get_user_level(user_id)
+        level = self._level_from_doc(user_doc)
 
         # Generate prompt using new method
         generated_prompt = self.generate_review_prompt_from_items(review_items, level)
 
         # Create review document
-        now = datetime.now(timezone.utc)
-
         # Use corrections as "struggle_words" for UI display
         display_words = [r.correction[:50] for r in review_items]  # Truncate long corrections
 
@@ -496,7 +474,10 @@ Be warm and encouraging. Help gently if they struggle."""
             'sessionId': None,
             'stars': None,
         }
-        existing_ref.set(review_data)
+        # The lesson and its item updates go out in one atomic batch
+        # (at most 1 + MAX_STRUGGLES writes, well under the 500-write cap)
+        batch = self._db.batch()
+        batch.set(existing_ref, review_data)
 
         # Update review items with review inclusion (new collection)
         for item in review_items:
@@ -510,7 +491,8 @@ Be warm and encouraging. Help gently if they struggle."""
             # Mark as mastered if this is the 3rd review
             if new_review_count >= self.MAX_REVIEW_COUNT:
                 update_data['mastered'] = True
-            item_ref.update(update_data)
+            batch.update(item_ref, update_data)
+        batch.commit()
 
         print(f'[Review] Created review for user {user_id} with {len(review_items)} items at level {level}')
         return review
@@ -518,11 +500,16 @@ Be warm and encouraging. Help gently if they struggle."""
 
 # Singleton instance
 _review_service: Optional[ReviewService] = None
+_review_service_lock = threading.Lock()
 
 
 def get_review_service() -> ReviewService:
     """Get singleton review service instance."""
+    # Lazy (it opens a Firestore client); the lock keeps two concurrent
+    # first calls from each building one
     global _review_service
     if _review_service is None:
-        _review_service = ReviewService()
+        with _review_service_lock:
+            if _review_service is None:
+                _review_service = ReviewService()
     return _review_service
@@ -11,6 +11,7 @@ from contextlib import asynccontextmanager
 from datetime import datetime, timedelta, timezone
 
 from fastapi import FastAPI, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from google.cloud import firestore
@@ -19,7 +20,7 @@ from app.config import config
 from app.token_service import get_token_service
 from app.review_service import get_review_service
 from app.analytics_service import get_analytics_service
-from app.language_service import get_language_service
+from app.language_service import LanguageService, get_language_service
 from app.prompt_builder import get_prompt_builder
 
 
@@ -215,6 +216,7 @@ async def root():
             "review_generate": "POST /api/review/generate",
             "review_batch": "POST /api/review/generate-batch",
             "analytics": "GET /api/analytics/teacher/{teacherId}",
+            "analytics_snapshots": "POST /api/analytics/snapshots/generate-batch",
             "mistakes": "GET /api/mistakes/teacher/{teacherId}",
             "pulse_get": "GET /api/pulse/teacher/{teacherId}",
             "pulse_generate": "POST /api/pulse/teacher/{teacherId}",
@@ -255,7 +257,7 @@ async def generate_review(request: GenerateReviewRequest):
     """
     try:
         review_service = get_review_service()
-        review = review_service.create_review_lesson(request.userId)
+        review = await run_in_threadpool(review_service.create_review_lesson, request.userId)
 
         if review:
             return GenerateReviewResponse(
@@ -309,18 +311,20 @@ async def generate_batch_reviews(request: GenerateBatchReviewsRequest):
         # Get users with recent sessions (last 7 days)
         seven_days_ago = datetime.now(timezone.utc) - timedelta(days=7)
         users_ref = db.collection('users')
-        query = users_ref.where('lastSessionAt', '>=', seven_days_ago)
+        query = users_ref.where('lastSessionAt', '>=', seven_days_ago).select([])
+
+        # Firestore calls are blocking; keep them off the event loop
+        user_ids = await run_in_threadpool(lambda: [doc.id for doc in query.stream()])
 
         users_processed = 0
         reviews_created = 0
         errors = 0
 
-        for user_doc in query.stream():
-            user_id = user_doc.id
+        for user_id in user_ids:
             users_processed += 1
 
             try:
-                review = review_service.create_review_lesson(user_id)
+                review = await run_in_threadpool(review_service.create_review_lesson, user_id)
                 if review:
                     reviews_created += 1
             except Exception as e:
@@ -374,13 +378,52 @@ async def get_teacher_analytics(
 
     try:
         analytics_service = get_analytics_service()
-        result = analytics_service.get_teacher_analytics(teacherId, period, level)
+        result = await run_in_threadpool(analytics_service.get_teacher_analytics, teacherId, period, level)
         return result
     except Exception as e:
         print(f"[Analytics] Error: {e}", flush=True)
         raise HTTPException(status_code=500, detail=str(e))
 
 
+class GenerateSnapshotsRequest(BaseModel):
+    """Request for nightly analytics snapshot generation (scheduler trigger)."""
+    triggerSecret: str  # Simple auth for scheduler
+    date: Optional[str] = None  # YYYY-MM-DD (UTC), defaults to yesterday
+
+
+class GenerateSnapshotsResponse(BaseModel):
+    """Response for snapshot generation."""
+    teachersProcessed: int
+    errors: int
+
+
+@app.post("/api/analytics/snapshots/generate-batch", response_model=GenerateSnapshotsResponse)
+async def generate_analytics_snapshots(request: GenerateSnapshotsRequest):
+    """
+    Materialize yesterday's analytics rollup for every teacher.
+
+    Triggered nightly by Cloud Scheduler. Requires SCHEDULER_SECRET env var.
+    Writes teachers/{teacherId}/analyticsSnapshots/{date}, which the analytics
+    endpoint sums for previous-period trends instead of re-scanning sessions.
+    """
+    expected_secret = os.getenv("SCHEDULER_SECRET", "")
+    if not expected_secret or request.triggerSecret != expected_secret:
+        raise HTTPException(status_code=403, detail="Invalid scheduler secret")
+
+    try:
+        day = datetime.strptime(request.date, "%Y-%m-%d").date() if request.date else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date. Use: YYYY-MM-DD")
+
+    try:
+        analytics_service = get_analytics_service()
+        result = await run_in_threadpool(analytics_service.generate_daily_snapshots, day)
+        return GenerateSnapshotsResponse(**result)
+    except Exception as e:
+        print(f"[Analytics] Snapshot batch error: {e}", flush=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 # ==================== CLASS MISTAKES ENDPOINTS ====================
 
 @app.get("/api/mistakes/teacher/{teacherId}")
@@ -406,7 +449,7 @@ async def get_class_mistakes(
 
     try:
         analytics_service = get_analytics_service()
-        result = analytics_service.get_class_mistakes(teacherId, period)
+        result = await run_in_threadpool(analytics_service.get_class_mistakes, teacherId, period)
         return result
     except Exception as e:
         print(f"[Mistakes] Error: {e}", flush=True)
@@ -425,7 +468,7 @@ async def get_class_pulse(teacherId: str):
     """
     try:
         analytics_service = get_analytics_service()
-        result = analytics_service.get_class_pulse(teacherId)
+        result = await run_in_threadpool(analytics_service.get_class_pulse, teacherId)
         return result
     except Exception as e:
         print(f"[ClassPulse] Error getting pulse: {e}", flush=True)
@@ -459,7 +502,9 @@ async def generate_class_pulse(teacherId: str, force: bool = False):
     try:
         print(f"[ClassPulse] POST request for teacher {teacherId}, force={force}", flush=True)
         analytics_service = get_analytics_service()
-        result = analytics_service.generate_class_pulse(teacherId, force=force)
+        # Blocking Firestore + Gemini work runs off the event loop so other
+        # requests keep being served while Gemini is generating
+        result = await run_in_threadpool(analytics_service.generate_class_pulse, teacherId, force=force)
         return result
     except Exception as e:
         import traceback
@@ -509,7 +554,9 @@ async def translate_text(request: TranslateRequest):
     """
     try:
         language_service = get_language_service()
-        result = language_service.translate_text(
+        # Off the event loop so concurrent translations can be batched together
+        result = await run_in_threadpool(
+            language_service.translate_text,
             text=request.text,
             target_language=request.targetLanguage,
             source_language=request.sourceLanguage
@@ -536,11 +583,12 @@ class TTSRequest(BaseModel):
     voiceName: Optional[str] = None
     speakingRate: float = 0.9  # Slightly slower for learning
     pitch: float = 0.0
+    audioEncoding: str = "MP3"  # "MP3" or "OGG_OPUS"
 
 
 class TTSResponse(BaseModel):
     """Response with audio data."""
-    audioContent: str  # Base64-encoded MP3 audio
+    audioContent: str  # Base64-encoded audio (MP3 unless OGG_OPUS was requested)
     contentType: str
 
 
@@ -558,26 +606,37 @@ async def text_to_speech(request: TTSRequest):
         voiceName: Optional specific voice name
         speakingRate: Speech speed (0.25-4.0, default: 0.9 for clarity)
         pitch: Voice pitch adjustment (-20 to 20)
+        audioEncoding: "MP3" (default) or "OGG_OPUS"
 
     Returns:
-        audioContent: Base64-encoded MP3 audio
-        contentType: MIME type (audio/mpeg)
+        audioContent: Base64-encoded audio
+        contentType: MIME type (audio/mpeg or audio/ogg)
     """
+    content_type = LanguageService.AUDIO_CONTENT_TYPES.get(request.audioEncoding)
+    if content_type is None:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid audioEncoding. Use: {', '.join(LanguageService.AUDIO_CONTENT_TYPES)}"
+        )
+
     try:
         language_service = get_language_service()
-        audio_base64 = language_service.text_to_speech_base64(
+        # Synthesis takes seconds; run it off the event loop
+        audio_base64 = await run_in_threadpool(
+            language_service.text_to_speech_base64,
             text=request.text,
             language_code=request.languageCode,
             voice_name=request.voiceName,
             speaking_rate=request.speakingRate,
-            pitch=request.pitch
+            pitch=request.pitch,
+            audio_encoding=request.audioEncoding
         )
 
         print(f"[TTS] Generated audio for: '{request.text[:50]}...'", flush=True)
 
         return TTSResponse(
             audioContent=audio_base64,
-            contentType="audio/mpeg"
+            contentType=content_type
         )
     except Exception as e:
         print(f"[TTS] Error: {e}", flush=True)
@@ -605,7 +664,7 @@ async def ask_class_question(teacherId: str, request: AskQuestionRequest):
     try:
         print(f"[ClassPulse] Question from teacher {teacherId}: {request.question}", flush=True)
         analytics_service = get_analytics_service()
-        result = analytics_service.answer_class_question(teacherId, request.question)
+        result = await run_in_threadpool(analytics_service.answer_class_question, teacherId, request.question)
         return result
     except Exception as e:
         import traceback
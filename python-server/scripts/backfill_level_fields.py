@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+One-time backfill of the denormalized teacherId/level fields used by teacher analytics.
+
+Teacher analytics reads the class straight from composite indexes:
+- reviewItems:      (teacherId, createdAt)              [collection group]
+- sessionSummaries: (teacherId, createdAt)              [collection group]
+
+Root sessions are tagged too, but analytics still selects them by missionId:
+the client only tags them when the summary is saved, best effort.
+
+Documents written before the client denormalized these fields are missing
+them, so analytics keeps reading through the per-mission / per-student paths
+until TEACHER_ID_TAGGED_SINCE is set. This script fills in:
+- sessions.teacherId / sessions.targetLevel from the session's mission
+- reviewItems.teacherId from the owning user (the client writes the student's
+  teacher, and items without a mission still get it)
+- sessionSummaries.teacherId / sessionSummaries.targetLevel from the summary's mission
+
+Usage:
+    python scripts/backfill_level_fields.py [--dry-run]
+
+Safe to re-run: documents that already carry the fields are skipped.
+Once it has completed, set TEACHER_ID_TAGGED_SINCE to a day before the oldest data.
+"""
+
+import os
+import sys
+from google.cloud import firestore
+from google.oauth2 import service_account
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Firestore allows at most 500 writes per batch
+BATCH_SIZE = 400
+
+
+def get_firestore_client():
+    """Initialize Firestore client."""
+    creds_path = os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        'firebase-service-account.json'
+    )
+    if os.path.exists(creds_path):
+        credentials = service_account.Credentials.from_service_account_file(creds_path)
+        return firestore.Client(project='ndtutorlive', credentials=credentials)
+    else:
+        return firestore.Client(project='ndtutorlive')
+
+
+class BatchWriter:
+    """Accumulates updates and commits them in BATCH_SIZE chunks."""
+
+    def __init__(self, db, dry_run: bool):
+        self._db = db
+        self._dry_run = dry_run
+        self._batch = db.batch()
+        self._pending = 0
+        self.written = 0
+
+    def update(self, ref, fields: dict):
+        self.written += 1
+        if self._dry_run:
+            return
+        self._batch.update(ref, fields)
+        self._pending += 1
+        if self._pending >= BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        if self._pending:
+            self._batch.commit()
+            self._batch = self._db.batch()
+            self._pending = 0
+
+
+def backfill_sessions(db, query, missions: dict, writer: BatchWriter):
+    """Set teacherId/targetLevel on session (or session summary) docs from their mission."""
+    scanned = 0
+    for doc in query.select(['missionId', 'teacherId', 'targetLevel']).stream():
+        scanned += 1
+        data = doc.to_dict()
+        mission = missions.get(data.get('missionId'))
+        if not mission:
+            continue
+        fields = {}
+        if not data.get('teacherId') and mission.get('teacherId'):
+            fields['teacherId'] = mission['teacherId']
+        if not data.get('targetLevel'):
+            fields['targetLevel'] = mission.get('targetLevel', 'B1')
+        if fields:
+            writer.update(doc.reference, fields)
+    print(f"  Scanned {scanned} docs")
+
+
+def backfill_review_items(db, writer: BatchWriter):
+    """Set teacherId on every users/{uid}/reviewItems doc from its owner."""
+    teacher_ids = {
+        doc.id: doc.to_dict().get('teacherId')
+        for doc in db.collection('users').select(['teacherId']).stream()
+    }
+    scanned = 0
+    query = db.collection_group('reviewItems').select(['teacherId'])
+    for doc in query.stream():
+        scanned += 1
+        teacher_id = teacher_ids.get(doc.reference.parent.parent.id)
+        if not doc.to_dict().get('teacherId') and teacher_id:
+            writer.update(doc.reference, {'teacherId': teacher_id})
+    print(f"  Scanned {scanned} review items")
+
+
+def main():
+    """Main function to backfill level fields."""
+    dry_run = '--dry-run' in sys.argv
+    db = get_firestore_client()
+
+    print(f"\n{'='*60}")
+    print(f"Backfilling analytics level fields{' (dry run)' if dry_run else ''}")
+    print(f"{'='*60}\n")
+
+    missions = {
+        doc.id: doc.to_dict()
+        for doc in db.collection('missions').select(['teacherId', 'targetLevel']).stream()
+    }
+    print(f"Loaded {len(missions)} missions")
+
+    writer = BatchWriter(db, dry_run)
+
+    print("\nBackfilling sessions...")
+    backfill_sessions(db, db.collection('sessions'), missions, writer)
+    print("\nBackfilling session summaries...")
+    backfill_sessions(db, db.collection_group('sessionSummaries'), missions, writer)
+    print("\nBackfilling review items...")
+    backfill_review_items(db, writer)
+    writer.flush()
+
+    verb = "Would update" if dry_run else "Updated"
+    print(f"\n{verb} {writer.written} documents")
+
+
+if __name__ == '__main__':
+    main()
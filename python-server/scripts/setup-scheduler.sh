@@ -54,6 +54,28 @@ gcloud scheduler jobs create http "$JOB_NAME" \
     --attempt-deadline="600s" \
     --description="Generates weekly review lessons for all active users every Sunday at 6PM Kyiv time"
 
+# Nightly analytics snapshot job (rolls up yesterday for every teacher)
+SNAPSHOT_JOB_NAME="analytics-snapshot-generator"
+# Schedule: Every day at 00:30 UTC, after the UTC day has closed
+SNAPSHOT_SCHEDULE="30 0 * * *"
+
+if gcloud scheduler jobs describe "$SNAPSHOT_JOB_NAME" --location="$LOCATION" &>/dev/null; then
+    echo "Job '$SNAPSHOT_JOB_NAME' already exists. Deleting and recreating..."
+    gcloud scheduler jobs delete "$SNAPSHOT_JOB_NAME" --location="$LOCATION" --quiet
+fi
+
+echo "Creating analytics snapshot job..."
+gcloud scheduler jobs create http "$SNAPSHOT_JOB_NAME" \
+    --location="$LOCATION" \
+    --schedule="$SNAPSHOT_SCHEDULE" \
+    --time-zone="Etc/UTC" \
+    --uri="${SERVER_URL}/api/analytics/snapshots/generate-batch" \
+    --http-method=POST \
+    --headers="Content-Type=application/json" \
+    --message-body="{\"triggerSecret\":\"${SCHEDULER_SECRET}\"}" \
+    --attempt-deadline="600s" \
+    --description="Materializes yesterday's teacher analytics snapshots every night"
+
 echo ""
 echo "✅ Cloud Scheduler job created successfully!"
 echo ""
@@ -62,6 +84,10 @@ echo "  Name:     $JOB_NAME"
 echo "  Schedule: $SCHEDULE ($TIMEZONE)"
 echo "  Endpoint: ${SERVER_URL}/api/review/generate-batch"
 echo ""
+echo "  Name:     $SNAPSHOT_JOB_NAME"
+echo "  Schedule: $SNAPSHOT_SCHEDULE (Etc/UTC)"
+echo "  Endpoint: ${SERVER_URL}/api/analytics/snapshots/generate-batch"
+echo ""
 echo "To test the job manually, run:"
 echo "  gcloud scheduler jobs run $JOB_NAME --location=$LOCATION"
 echo ""
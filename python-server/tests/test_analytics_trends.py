@@ -0,0 +1,269 @@
+"""
+Unit tests for the previous-period trend inputs in app/analytics_service.py:
+summing the nightly snapshots must give the same numbers as the live
+aggregation over the same period.
+
+Uses a small in-memory Firestore fake, so no credentials or network are needed.
+
+Run: python -m unittest discover -s tests -p "test_analytics_trends.py"
+"""
+
+import itertools
+import operator
+import os
+import sys
+import threading
+import unittest
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+# Add parent to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.analytics_service import AnalyticsService
+
+
+_OPS = {
+    '==': operator.eq, '>': operator.gt, '>=': operator.ge,
+    '<': operator.lt, '<=': operator.le, 'in': lambda value, options: value in options,
+}
+
+
+class FakeSnapshot:
+
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+
+class FakeDocument:
+
+    def __init__(self, db, path):
+        self._db = db
+        self.path = path
+        self.id = path.rsplit('/', 1)[-1]
+
+    def collection(self, name):
+        return FakeQuery(self._db, f'{self.path}/{name}')
+
+    def get(self):
+        return FakeSnapshot(self, self._db.docs.get(self.path))
+
+    def set(self, data):
+        self._db.docs[self.path] = dict(data)
+
+
+class FakeAggregation:
+    """count()/sum() aggregations, chainable like Firestore's AggregationQuery."""
+
+    def __init__(self, query, aggregations):
+        self._query = query
+        self._aggregations = aggregations
+
+    def count(self, alias):
+        return FakeAggregation(self._query, self._aggregations + [(alias, None)])
+
+    def sum(self, field, alias):
+        return FakeAggregation(self._query, self._aggregations + [(alias, field)])
+
+    def get(self):
+        matches = self._query._matches()
+        results = []
+        for alias, field in self._aggregations:
+            value = len(matches) if field is None else sum(doc.get(field) or 0 for _, doc in matches)
+            results.append(mock.Mock(alias=alias, value=value))
+        return [results]
+
+
+class FakeQuery:
+    """The collection/query subset AnalyticsService uses, over plain dicts."""
+
+    def __init__(self, db, path, filters=(), order=None, fields=None, limit=None, after=None):
+        self._db = db
+        self._path = path
+        self._filters = list(filters)
+        self._order = order
+        self._fields = fields
+        self._limit = limit
+        self._after = after
+
+    def _copy(self, **changes):
+        state = dict(filters=self._filters, order=self._order, fields=self._fields, limit=self._limit, after=self._after)
+        state.update(changes)
+        return FakeQuery(self._db, self._path, **state)
+
+    def document(self, doc_id):
+        return FakeDocument(self._db, f'{self._path}/{doc_id}')
+
+    def where(self, field, op, value):
+        return self._copy(filters=self._filters + [(field, op, value)])
+
+    def order_by(self, field):
+        return self._copy(order=field)
+
+    def select(self, fields):
+        return self._copy(fields=list(fields))
+
+    def limit(self, count):
+        return self._copy(limit=count)
+
+    def start_after(self, snapshot):
+        return self._copy(after=snapshot.reference.path)
+
+    def count(self, alias):
+        return FakeAggregation(self, [(alias, None)])
+
+    def sum(self, field, alias):
+        return FakeAggregation(self, [(alias, field)])
+
+    def _matches(self):
+        matches = []
+        for path, doc in self._db.docs.items():
+            if path.rsplit('/', 1)[0] != self._path:
+                continue
+            if all(field in doc and _OPS[op](doc[field], value) for field, op, value in self._filters):
+                matches.append((path, doc))
+        if self._order:
+            matches.sort(key=lambda match: (match[1][self._order], match[0]))
+        return matches
+
+    def stream(self):
+        matches = self._matches()
+        if self._after is not None:
+            matches = matches[[path for path, _ in matches].index(self._after) + 1:]
+        if self._limit is not None:
+            matches = matches[:self._limit]
+        for path, doc in matches:
+            if self._fields is not None:
+                doc = {field: value for field, value in doc.items() if field in self._fields}
+            yield FakeSnapshot(FakeDocument(self._db, path), doc)
+
+
+class FakeFirestore:
+
+    def __init__(self):
+        self.docs = {}
+
+    def collection(self, name):
+        return FakeQuery(self, name)
+
+    def document(self, path):
+        return FakeDocument(self, path)
+
+    def get_all(self, refs):
+        return [ref.get() for ref in refs]
+
+
+def make_service(db):
+    """AnalyticsService wired to a fake client, skipping credential and Gemini setup."""
+    service = AnalyticsService.__new__(AnalyticsService)
+    service._analytics_cache, service._analytics_cache_lock = {}, threading.Lock()
+    service._user_cache, service._user_cache_lock = {}, threading.Lock()
+    service._pulse_cache, service._pulse_cache_lock = {}, threading.Lock()
+    service._db_clients = [db]
+    service._db_thread_local = threading.local()
+    service._db_round_robin = itertools.count()
+    return service
+
+
+def at(day, hour, minute=0):
+    return datetime(2026, 3, day, hour, minute, tzinfo=timezone.utc)
+
+
+class PreviousPeriodTrendTest(unittest.TestCase):
+
+    # The current week starts mid-afternoon on March 10, so the previous
+    # period is the whole UTC days March 3-9
+    CURRENT_START = at(10, 15, 30)
+
+    def setUp(self):
+        self.db = FakeFirestore()
+        self.service = make_service(self.db)
+        put = self.db.docs.__setitem__
+
+        put('missions/m-b1', {'teacherId': 't1', 'targetLevel': 'B1'})
+        put('missions/m-b2', {'teacherId': 't1', 'targetLevel': 'B2'})
+        put('missions/other', {'teacherId': 't2', 'targetLevel': 'B1'})
+        put('users/ana', {'teacherId': 't1', 'level': 'B1'})
+        put('users/ben', {'teacherId': 't1', 'level': 'B2'})
+        # Has summaries in the period but no session started on those days
+        put('users/cleo', {'teacherId': 't1', 'level': 'B1'})
+        put('users/dev', {'teacherId': 't2', 'level': 'B1'})
+
+        sessions = [
+            ('ana', 'm-b1', at(2, 23, 50)),   # day before the period
+            ('ana', 'm-b1', at(3, 0, 0)),
+            ('ana', 'm-b1', at(5, 9)),
+            ('ben', 'm-b2', at(5, 18)),
+            ('ben', 'm-b1', at(7, 12)),
+            ('ana', 'm-b2', at(9, 23, 55)),   # summary lands the next day
+            ('ana', 'm-b1', at(10, 8)),       # between the periods
+            ('dev', 'other', at(6, 10)),      # another teacher's class
+        ]
+        for i, (user_id, mission_id, created_at) in enumerate(sessions):
+            level = self.db.docs[f'missions/{mission_id}']['targetLevel']
+            teacher_id = self.db.docs[f'missions/{mission_id}']['teacherId']
+            put(f'sessions/s{i}', {
+                'userId': user_id, 'missionId': mission_id, 'teacherId': teacher_id,
+                'targetLevel': level, 'createdAt': created_at,
+            })
+
+        summaries = [
+            ('ana', 4, at(3, 0, 20)),
+            ('ana', 5, at(5, 9, 30)),
+            ('ben', 3, at(5, 18, 20)),
+            ('ben', 2, at(7, 12, 30)),
+            ('ana', 4, at(10, 0, 5)),
+            ('cleo', 5, at(4, 11)),
+            ('cleo', 1, at(8, 16)),
+            ('cleo', 0, at(8, 17)),           # unrated, left out of the average
+            ('dev', 5, at(6, 10, 20)),
+        ]
+        for i, (user_id, stars, created_at) in enumerate(summaries):
+            put(f'users/{user_id}/sessionSummaries/sum{i}', {'stars': stars, 'createdAt': created_at})
+
+    def live_trend_inputs(self, prev_start, prev_end):
+        mission_map = {doc.id: doc.to_dict() for doc in self.service._query_missions('t1', 'all')}
+        counts = self.service._count_sessions_by_level(mission_map, prev_start, prev_end)
+        return counts, self.service._class_star_totals('t1', prev_start, prev_end)
+
+    def snapshot_trend_inputs(self, prev_start, prev_end):
+        day = prev_start.date()
+        while day <= prev_end.date():
+            self.service.build_daily_snapshot('t1', day)
+            day += timedelta(days=1)
+        return self.service._load_snapshot_trend_inputs('t1', prev_start, prev_end)
+
+    def without_empty_levels(self, trend_inputs):
+        counts, star_totals = trend_inputs
+        return (
+            {level: count for level, count in counts.items() if count},
+            {level: totals for level, totals in star_totals.items() if totals != (0, 0)},
+        )
+
+    def test_previous_period_is_whole_utc_days(self):
+        prev_start, prev_end = self.service._get_previous_period('week', self.CURRENT_START)
+        self.assertEqual(prev_start, at(3, 0))
+        self.assertEqual(prev_end, at(10, 0) - timedelta(microseconds=1))
+
+    def test_snapshots_match_live_aggregation(self):
+        prev_start, prev_end = self.service._get_previous_period('week', self.CURRENT_START)
+        live = self.without_empty_levels(self.live_trend_inputs(prev_start, prev_end))
+        snapshots = self.without_empty_levels(self.snapshot_trend_inputs(prev_start, prev_end))
+        self.assertEqual(snapshots, live)
+        self.assertEqual(live, ({'B1': 3, 'B2': 2}, {'B1': (15, 4), 'B2': (5, 2)}))
+
+    def test_missing_snapshot_day_falls_back_to_live(self):
+        prev_start, prev_end = self.service._get_previous_period('week', self.CURRENT_START)
+        self.snapshot_trend_inputs(prev_start, prev_end)
+        del self.db.docs['teachers/t1/analyticsSnapshots/2026-03-06']
+        self.assertIsNone(self.service._load_snapshot_trend_inputs('t1', prev_start, prev_end))
+
+
+if __name__ == '__main__':
+    unittest.main()
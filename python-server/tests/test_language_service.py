@@ -0,0 +1,137 @@
+"""
+Unit tests for translate_text, the translation batcher and the long-text
+splitter in app/language_service.py.
+
+Uses a fake Cloud Translation client, so no credentials or network are needed.
+
+Run: python -m unittest discover -s tests -p "test_language_service.py"
+"""
+
+import os
+import sys
+import threading
+import unittest
+
+# Add parent to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.language_service import LanguageService, _TranslationBatcher, _split_long_text
+
+
+class FakeTranslateClient:
+    """Upper-cases each segment; raises for any call that includes a 'BAD' segment."""
+
+    def __init__(self):
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def translate(self, values, target_language, source_language=None):
+        with self._lock:
+            self.calls.append((list(values), target_language, source_language))
+        if any('BAD' in value for value in values):
+            raise ValueError('bad segment')
+        return [
+            {'translatedText': value.upper(), 'detectedSourceLanguage': source_language or 'en'}
+            for value in values
+        ]
+
+
+class TranslationBatcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = FakeTranslateClient()
+        self.batcher = _TranslationBatcher(lambda: self.client)
+
+    def submit_together(self, segments, target='uk', source=None):
+        """Submit segments back to back so they land in one batching window."""
+        return [self.batcher.submit(segment, target, source) for segment in segments]
+
+    def test_concurrent_segments_share_one_call(self):
+        futures = self.submit_together(['one', 'two', 'three'])
+        self.assertEqual([f.result(timeout=5)['translatedText'] for f in futures], ['ONE', 'TWO', 'THREE'])
+        self.assertEqual(len(self.client.calls), 1)
+
+    def test_groups_by_target_and_source(self):
+        futures = self.submit_together(['a'], target='uk') + self.submit_together(['b'], target='es')
+        self.assertEqual([f.result(timeout=5)['translatedText'] for f in futures], ['A', 'B'])
+        self.assertEqual(sorted(call[1] for call in self.client.calls), ['es', 'uk'])
+
+    def test_failed_batch_only_fails_the_bad_segment(self):
+        futures = self.submit_together(['fine', 'BAD', 'also fine'])
+        self.assertEqual(futures[0].result(timeout=5)['translatedText'], 'FINE')
+        self.assertEqual(futures[2].result(timeout=5)['translatedText'], 'ALSO FINE')
+        with self.assertRaises(ValueError):
+            futures[1].result(timeout=5)
+
+    def test_oversized_batch_is_split(self):
+        segment = 'x' * (_TranslationBatcher.MAX_CODE_POINTS // 2 + 1)
+        futures = self.submit_together([segment, segment, segment])
+        for future in futures:
+            self.assertEqual(future.result(timeout=5)['translatedText'], segment.upper())
+        for values, _, _ in self.client.calls:
+            self.assertLessEqual(sum(len(v) for v in values), _TranslationBatcher.MAX_CODE_POINTS)
+
+    def test_worker_survives_dispatch_error(self):
+        original_split = self.batcher._split
+        self.batcher._split = lambda items: (_ for _ in ()).throw(RuntimeError('dispatch failed'))
+        failed = self.batcher.submit('first', 'uk', None)
+        with self.assertRaises(RuntimeError):
+            failed.result(timeout=5)
+
+        self.batcher._split = original_split
+        self.assertEqual(self.batcher.submit('second', 'uk', None).result(timeout=5)['translatedText'], 'SECOND')
+
+    def test_worker_restarts_if_it_died(self):
+        self.batcher.submit('warm up', 'uk', None).result(timeout=5)
+        self.batcher._worker = threading.Thread(target=lambda: None)
+        self.batcher._worker.start()
+        self.batcher._worker.join()
+        self.assertEqual(self.batcher.submit('again', 'uk', None).result(timeout=5)['translatedText'], 'AGAIN')
+
+
+class TranslateTextTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = FakeTranslateClient()
+        self.service = LanguageService()
+        self.service._translate_client = self.client
+
+    def test_same_language_skips_the_api(self):
+        result = self.service.translate_text('Hello', 'en', source_language='en-US')
+        self.assertEqual(result, {'translatedText': 'Hello', 'detectedSourceLanguage': 'en-US', 'targetLanguage': 'en'})
+        self.assertEqual(self.client.calls, [])
+
+    def test_different_language_is_translated(self):
+        result = self.service.translate_text('Hello', 'uk-UA', source_language='en-US')
+        self.assertEqual(result['translatedText'], 'HELLO')
+        self.assertEqual(len(self.client.calls), 1)
+
+
+class SplitLongTextTest(unittest.TestCase):
+
+    def assertRoundTrips(self, text, limit):
+        pieces = _split_long_text(text, limit)
+        self.assertEqual(''.join(piece + separator for piece, separator in pieces), text)
+        for piece, _ in pieces:
+            self.assertLessEqual(len(piece), limit)
+        return pieces
+
+    def test_keeps_paragraph_breaks(self):
+        pieces = self.assertRoundTrips('Hello there.\n\nNew para!', 14)
+        self.assertEqual(pieces, [('Hello there.', '\n\n'), ('New para!', '')])
+
+    def test_packs_sentences_up_to_the_limit(self):
+        pieces = self.assertRoundTrips('One. Two. Three. Four.', 10)
+        self.assertEqual([piece for piece, _ in pieces], ['One. Two.', 'Three.', 'Four.'])
+
+    def test_long_sentence_is_cut_at_a_space(self):
+        pieces = self.assertRoundTrips('alpha beta gamma delta', 11)
+        self.assertEqual(pieces, [('alpha beta', ' '), ('gamma delta', '')])
+
+    def test_text_without_spaces_is_hard_cut_without_separator(self):
+        pieces = self.assertRoundTrips('日本語の文章です。次の文です。', 5)
+        self.assertTrue(all(separator == '' for _, separator in pieces))
+
+
+if __name__ == '__main__':
+    unittest.main()
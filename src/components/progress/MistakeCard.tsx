@@ -146,7 +146,7 @@ export default function MistakeCard({
         });
 
       // Play the audio immediately
-      const audioData = `data:audio/mpeg;base64,${response.audioContent}`;
+      const audioData = `data:${response.contentType};base64,${response.audioContent}`;
       const audio = new Audio(audioData);
       ttsAudioRef.current = audio;
 
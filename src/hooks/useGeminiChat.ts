@@ -484,7 +484,8 @@ export function useGeminiChat(
                 userIdRef.current,
                 params,
                 missionIdRef.current || undefined,
-                audioBlob // Pass extracted audio for background upload
+                audioBlob, // Pass extracted audio for background upload
+                roleRef.current?.teacherId || undefined
               );
 
               // Track mistake for end-of-session prompt
@@ -219,6 +219,27 @@ export const saveStruggleItem = async (
 
 // ==================== REVIEW ITEMS (NEW) ====================
 
+/**
+ * Best-effort increment of teachers/{teacherId}/meta/liveCounters.
+ * The backend compares these running totals against the values saved with
+ * the last Class Pulse to decide whether new insights are worth generating.
+ *
+ * Runs after the data write and never throws: the rules only accept it from
+ * the teacher's own students, so a teacher testing their lesson (or a student
+ * whose class changed) is rejected here without losing the data itself.
+ */
+const incrementTeacherLiveCounter = async (
+  teacherId: string,
+  field: 'sessionCount' | 'struggleCount'
+): Promise<void> => {
+  try {
+    const countersRef = doc(db!, 'teachers', teacherId, 'meta', 'liveCounters');
+    await setDoc(countersRef, { [field]: increment(1), updatedAt: Timestamp.now() }, { merge: true });
+  } catch (error) {
+    console.warn('[SessionData] Could not update teacher live counters:', error);
+  }
+};
+
 /**
  * Save a review item to user's reviewItems collection
  * Called when Gemini's mark_for_review function is triggered
@@ -231,13 +252,15 @@ export const saveStruggleItem = async (
  * @param params - Mark for review parameters from Gemini
  * @param missionId - Optional lesson context
  * @param audioBlob - Optional WAV blob of error audio (uploaded in background)
+ * @param teacherId - Optional teacher ID, denormalized for teacher analytics
  */
 export const saveReviewItem = async (
   sessionId: string,
   userId: string,
   params: MarkForReviewParams,
   missionId?: string,
-  audioBlob?: Blob | null
+  audioBlob?: Blob | null,
+  teacherId?: string
 ): Promise<ReviewItemDocument> => {
   if (!db) throw new Error('Firebase not configured');
 
@@ -249,6 +272,7 @@ export const saveReviewItem = async (
     userId,
     sessionId,
     missionId: missionId || null,
+    teacherId: teacherId || null,
     errorType: params.error_type,
     severity: params.severity,
     userSentence: params.user_sentence,
@@ -262,8 +286,12 @@ export const saveReviewItem = async (
     includedInReviews: [],
   };
 
-  // Save document immediately (non-blocking audio upload)
+  // Save document immediately (non-blocking audio upload), then bump the
+  // teacher's live struggle counter
   await setDoc(reviewItemRef, reviewItem);
+  if (teacherId) {
+    await incrementTeacherLiveCounter(teacherId, 'struggleCount');
+  }
   console.log('[SessionData] Saved review item:', params.error_type, '-', params.user_sentence.substring(0, 30) + '...');
 
   // Upload audio in background if available (non-blocking, fire-and-forget)
@@ -635,6 +663,18 @@ export const saveSessionSummary = async (
 ): Promise<{ summary: SessionSummaryDocument; newBadges: BadgeDefinition[] }> => {
   if (!db) throw new Error('Firebase not configured');
 
+  // Read the mission once - its teacherId/targetLevel are denormalized onto
+  // the summary and session docs so analytics can skip the mission join
+  let missionData: Record<string, any> | null = null;
+  if (missionId) {
+    try {
+      const missionSnap = await getDoc(doc(db, 'missions', missionId));
+      missionData = missionSnap.exists() ? missionSnap.data() : null;
+    } catch (error) {
+      console.warn('[SessionData] Could not read mission for summary:', error);
+    }
+  }
+
   // Save detailed summary to subcollection
   const summaryRef = doc(db, `users/${userId}/sessionSummaries`, sessionId);
 
@@ -642,6 +682,8 @@ export const saveSessionSummary = async (
     sessionId,
     userId,
     missionId,
+    teacherId: missionData?.teacherId || null,
+    targetLevel: missionData?.targetLevel || null,
     didWell: params.did_well,
     workOn: params.work_on,
     stars: params.stars,
@@ -652,6 +694,9 @@ export const saveSessionSummary = async (
   };
 
   await setDoc(summaryRef, summary);
+  if (summary.teacherId) {
+    await incrementTeacherLiveCounter(summary.teacherId, 'sessionCount');
+  }
   console.log('[SessionData] Saved session summary with', params.stars, 'stars');
 
   // Update aggregate stats on user document for fast UI reads
@@ -747,6 +792,8 @@ export const saveSessionSummary = async (
       'feedback.strengths': params.did_well,
       'feedback.areasForImprovement': params.work_on,
       'feedback.generatedAt': Timestamp.now(),
+      teacherId: summary.teacherId,
+      targetLevel: summary.targetLevel,
       status: 'completed',
       endTime: Timestamp.now(),
       updatedAt: Timestamp.now(),
@@ -780,12 +827,8 @@ export const saveSessionSummary = async (
 
       // Only record if student has a teacher
       if (teacherId && missionId) {
-        // Get lesson title from missions collection
-        const missionRef = doc(db, 'missions', missionId);
-        const missionSnap = await getDoc(missionRef);
-        const lessonTitle = missionSnap.exists()
-          ? (missionSnap.data().title || 'Lesson')
-          : 'Lesson';
+        // Lesson title from the mission read above
+        const lessonTitle = missionData?.title || 'Lesson';
 
         await recordActivity({
           teacherId,
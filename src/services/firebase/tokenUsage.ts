@@ -9,8 +9,11 @@
  *     ├── tokenUsage (field on user doc) - Running totals for quick reads
  *     │     { totalTokens, totalCost, lastSessionAt }
  *     │
- *     └── sessions/{sessionId} (subcollection) - Detailed session data
- *           { inputTokens, outputTokens, cost, startTime, endTime, missionId }
+ *     ├── sessions/{sessionId} (subcollection) - Detailed session data
+ *     │     { inputTokens, outputTokens, cost, startTime, endTime, missionId }
+ *     │
+ *     └── tokenTotalsDaily/{YYYY-MM-DD} (subcollection) - Per-day totals keyed
+ *           by session start day (UTC) { inputTokens, outputTokens, sessionCount }
  *
  * Why this structure:
  * 1. Sessions as subcollection under users = natural security rules (user owns their data)
@@ -129,6 +132,23 @@ function getDayKey(date: Date): string {
   return date.toISOString().split('T')[0]; // YYYY-MM-DD
 }
 
+// Start day of each active session, so token updates land on the same daily doc
+const sessionDayKeys = new Map<string, string>();
+
+/**
+ * Start day (UTC) of a session. Cached in memory; after a page reload
+ * mid-session it is read back from the dayKey stored on the session doc.
+ */
+async function getSessionDayKey(userId: string, sessionId: string): Promise<string> {
+  const cached = sessionDayKeys.get(sessionId);
+  if (cached) return cached;
+
+  const sessionSnap = await getDoc(doc(db!, 'users', userId, 'sessions', sessionId));
+  const dayKey = (sessionSnap.exists() && sessionSnap.data().dayKey) || getDayKey(new Date());
+  sessionDayKeys.set(sessionId, dayKey);
+  return dayKey;
+}
+
 /**
  * Create a new session usage record
  * Stores in: users/{userId}/sessions/{sessionId}
@@ -149,8 +169,11 @@ export async function createSessionUsage(
 
   try {
     // Store session as subcollection under user
+    const dayKey = getDayKey(now);
     const sessionRef = doc(db, 'users', userId, 'sessions', sessionId);
-    await setDoc(sessionRef, {
+    const dailyRef = doc(db, 'users', userId, 'tokenTotalsDaily', dayKey);
+    const batch = writeBatch(db);
+    batch.set(sessionRef, {
       sessionId,
       userId,
       missionId: missionId || null,
@@ -163,11 +186,18 @@ export async function createSessionUsage(
       endTime: null,
       durationSeconds: 0,
       sessionHandle: sessionHandle || null,
-      dayKey: getDayKey(now),      // For daily aggregation queries
+      dayKey,                      // For daily aggregation queries
       monthKey: getMonthKey(now),  // For monthly aggregation queries
       createdAt: serverTimestamp(),
       updatedAt: serverTimestamp()
     });
+    batch.set(dailyRef, {
+      date: dayKey,
+      sessionCount: increment(1),
+      updatedAt: serverTimestamp()
+    }, { merge: true });
+    await batch.commit();
+    sessionDayKeys.set(sessionId, dayKey);
 
     console.log(`[TokenUsage] Created session: users/${userId}/sessions/${sessionId}`);
     return sessionId;
@@ -197,13 +227,23 @@ export async function updateSessionUsage(
     // If we have userId, use the new subcollection path
     if (userId) {
       const sessionRef = doc(db, 'users', userId, 'sessions', sessionId);
-      await updateDoc(sessionRef, {
+      const dayKey = await getSessionDayKey(userId, sessionId);
+      const dailyRef = doc(db, 'users', userId, 'tokenTotalsDaily', dayKey);
+      const batch = writeBatch(db);
+      batch.update(sessionRef, {
         inputTokens: increment(inputTokens),
         outputTokens: increment(outputTokens),
         totalTokens: increment(inputTokens + outputTokens),
         cost: increment(costDelta),
         updatedAt: serverTimestamp()
       });
+      batch.set(dailyRef, {
+        date: dayKey,
+        inputTokens: increment(inputTokens),
+        outputTokens: increment(outputTokens),
+        updatedAt: serverTimestamp()
+      }, { merge: true });
+      await batch.commit();
     } else {
       // Fallback to old root collection for backwards compatibility
       const docRef = doc(db, 'tokenUsage', sessionId);
@@ -284,6 +324,7 @@ export async function finalizeSessionUsage(
     }, { merge: true });
 
     await batch.commit();
+    sessionDayKeys.delete(sessionId);
     console.log(`[TokenUsage] Finalized session: ${sessionId} (${durationSeconds}s, $${cost.toFixed(4)})`);
   } catch (error) {
     console.error('[TokenUsage] Failed to finalize session:', error);
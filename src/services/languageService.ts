@@ -11,10 +11,13 @@ interface TranslateResponse {
 }
 
 interface TTSResponse {
-  audioContent: string; // Base64-encoded MP3
+  audioContent: string; // Base64-encoded audio (MP3 unless OGG_OPUS was requested)
   contentType: string;
 }
 
+/** TTS output encoding. MP3 plays everywhere; OGG_OPUS needs a recent Safari. */
+export type TTSAudioEncoding = 'MP3' | 'OGG_OPUS';
+
 export class LanguageService {
   private apiUrl: string;
 
@@ -59,7 +62,7 @@ export class LanguageService {
    * @param text - Text to synthesize
    * @param languageCode - BCP-47 language code (default: 'en-US')
    * @param options - Optional TTS settings
-   * @returns Base64-encoded MP3 audio
+   * @returns Base64-encoded audio and its MIME type
    */
   async textToSpeech(
     text: string,
@@ -68,6 +71,7 @@ export class LanguageService {
       voiceName?: string;
       speakingRate?: number;
       pitch?: number;
+      audioEncoding?: TTSAudioEncoding;
     }
   ): Promise<TTSResponse> {
     const response = await fetch(`${this.apiUrl}/api/tts`, {
@@ -79,6 +83,7 @@ export class LanguageService {
         voiceName: options?.voiceName,
         speakingRate: options?.speakingRate ?? 0.9,
         pitch: options?.pitch ?? 0.0,
+        audioEncoding: options?.audioEncoding ?? 'MP3',
       }),
     });
 
@@ -104,12 +109,13 @@ export class LanguageService {
       voiceName?: string;
       speakingRate?: number;
       pitch?: number;
+      audioEncoding?: TTSAudioEncoding;
     }
   ): Promise<HTMLAudioElement> {
     const ttsResponse = await this.textToSpeech(text, languageCode, options);
 
     // Create audio element from base64 data
-    const audio = new Audio(`data:audio/mpeg;base64,${ttsResponse.audioContent}`);
+    const audio = new Audio(`data:${ttsResponse.contentType};base64,${ttsResponse.audioContent}`);
 
     // Return a promise that resolves when audio starts playing
     return new Promise((resolve, reject) => {
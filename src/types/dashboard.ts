@@ -131,6 +131,7 @@ export interface AnalyticsData {
     avgStars: number;
     totalPracticeMinutes: number;
     wordsMastered: number;
+    struggleCount?: number;  // Sum of per-level topStruggles entries
   };
   // Cost tracking
   costs?: CostData;
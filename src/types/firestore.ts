@@ -381,6 +381,7 @@ export interface ReviewItemDocument {
   userId: string;
   sessionId: string;
   missionId: string | null;  // Lesson context
+  teacherId?: string | null;  // Denormalized for teacher analytics queries
   errorType: ReviewItemErrorType;
   severity: number;  // 1-10 scale
   userSentence: string;  // What the user said
@@ -455,6 +456,9 @@ export interface SessionSummaryDocument {
   sessionId: string;
   userId: string;
   missionId: string;
+  // Denormalized from the mission for teacher analytics queries
+  teacherId?: string | null;
+  targetLevel?: string | null;
   didWell: string[];
   workOn: string[];
   stars: 1 | 2 | 3 | 4 | 5;